@@ -0,0 +1,76 @@
+import hashlib
+import json
+from datetime import date, datetime
+from functools import wraps
+from flask import Response, request, make_response
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def json_value(value):
+    return value.isoformat() if isinstance(value, (date, datetime)) else value
+
+
+def parse_fields(value, allowed, default):
+    if not value:
+        return list(default)
+    fields = list(dict.fromkeys(field.strip() for field in value.split(',') if field.strip()))
+    unknown = [field for field in fields if field not in allowed]
+    if unknown:
+        raise ApiError(f"Unknown field(s): {', '.join(unknown)}. Available fields: {', '.join(allowed)}")
+    return fields
+
+
+def parse_ids(value, limit):
+    try:
+        ids = list(dict.fromkeys(int(part) for part in value.split(',') if part.strip()))
+    except ValueError:
+        raise ApiError("ids must be a comma separated list of integers")
+    if len(ids) > limit:
+        raise ApiError(f"At most {limit} ids can be requested at once")
+    return ids
+
+
+def parse_limit(value, default, maximum):
+    if value is None:
+        return default
+    try:
+        limit = int(value)
+    except ValueError:
+        raise ApiError("limit must be an integer")
+    if limit < 1:
+        raise ApiError("limit must be at least 1")
+    return min(limit, maximum)
+
+
+def select_fields(row, fields):
+    return {field: json_value(getattr(row, field)) for field in fields}
+
+
+def attach(payloads, field, rows, serialize):
+    for payload in payloads.values():
+        payload[field] = []
+    for row in rows:
+        payloads[row[0]][field].append(serialize(row))
+
+
+def json_response(payload, status=200):
+    return Response(json.dumps(payload, separators=(',', ':'), sort_keys=True), status=status,
+                    mimetype='application/json')
+
+
+def conditional(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        response = make_response(view(*args, **kwargs))
+        if response.status_code == 200:
+            response.set_etag(hashlib.sha256(response.get_data()).hexdigest())
+            response.cache_control.no_cache = True
+            return response.make_conditional(request)
+        return response
+    return wrapper
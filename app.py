@@ -1,6 +1,9 @@
+import click
 import sqlalchemy.exc
-from flask import Flask, render_template, render_template_string, request, abort, send_from_directory, send_file, \
-    redirect, url_for, flash
+from flask import Flask, render_template, render_template_string, request, abort, send_file, \
+    redirect, url_for, flash, Response, Request, make_response, jsonify
+from flask.cli import AppGroup
+from markupsafe import Markup
 from flask_login import LoginManager, login_required, UserMixin, login_user, logout_user, current_user
 from flask_wtf import FlaskForm
 from wtforms import StringField, PasswordField, BooleanField
@@ -8,16 +11,33 @@ from wtforms.validators import InputRequired, Email, Length
 from werkzeug.utils import secure_filename
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import or_
+from sqlalchemy import func
+from sqlalchemy.orm import selectinload
 from datetime import date, datetime
-from zipfile import ZipFile, ZIP_DEFLATED
+import glob
+import hmac
 import json
-import sass
 import os
-import io
 from flaskconf import SELECTED_CONFIG
-
-sass.compile(dirname=('static/styles/sass', 'static/styles/css'), output_style='compressed')
+from search import create_search_index
+from pagination import keyset_paginate, keyset_query, InvalidCursor
+from migrations import pending_migrations, upgrade
+from explain import check_plan
+from jobs import JobRunner, describe as describe_job
+from downloads import ArchiveCache, attachment_options, hash_file, offloaded_response, ranged_file_response, \
+    CHUNK_SIZE
+from storage import BlobStore, CHUNK_SIZE as UPLOAD_CHUNK_SIZE
+from fsck import FsckState, check_storage, reclaim_storage
+from logstats import LogSummary
+from assets import build_assets, load_manifest, manifest_stamp, DIST_DIRECTORY
+from instrumentation import Instrumentation
+from cache import create_generation, create_response_cache
+from facets import FacetIndex, FACETS, bitmap_from_ids
+from suggest import SuggestionIndex
+from vocabulary import AREA_UNITS_PATH, KEYWORDS_PATH, VocabularyDiff, read_area_units, read_keywords, \
+    read_vocabulary_snapshot, sync_areas, sync_keywords
+from api import ApiError, attach, conditional, json_response, parse_fields, parse_ids, parse_limit, select_fields
+from functools import wraps
 
 app = Flask(__name__)
 app.config.from_object(SELECTED_CONFIG)
@@ -25,6 +45,28 @@ db = SQLAlchemy(app)
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'login'
+instrumentation = Instrumentation(app)
+
+
+@app.url_defaults
+def hashed_static_filename(endpoint, values):
+    if endpoint == 'static' and 'filename' in values:
+        values['filename'] = get_asset_manifest().get(values['filename'], values['filename'])
+
+
+@app.after_request
+def cache_hashed_assets(response):
+    if request.endpoint == 'static' and request.view_args['filename'].startswith(f"{DIST_DIRECTORY}/"):
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = app.config.get("ASSET_MAX_AGE", 365 * 24 * 60 * 60)
+        response.cache_control.immutable = True
+    return response
+
+
+@app.context_processor
+def inject_page_url():
+    return {'page_url': page_url, 'facet_url': facet_url}
 
 
 @app.shell_context_processor
@@ -44,18 +86,298 @@ def make_shell_context():
 @app.cli.command('initdb')
 def initialize_database():
     db.create_all()
+    upgrade(db.session.connection())
+    if module_summaries_missing():
+        rebuild_module_summaries()
+    db.session.commit()
     new_admin = User.query.filter(User.username == 'admin').first()
-    areas = Area.query.all()
-    keywords = Keyword.query.all()
     if not new_admin:
         new_admin = User(username=app.config["ADMIN_USERNAME"],
                          password=generate_password_hash(app.config["ADMIN_PASSWORD"]))
         db.session.add(new_admin)
         db.session.commit()
-    if not len(areas):
-        load_areas()
-    if not len(keywords):
-        load_keywords()
+    ensure_search_index()
+    print_vocabulary_diff(load_vocabulary())
+    record_facet_changes()
+    db.session.commit()
+    invalidate_pages()
+    invalidate_facets()
+
+
+db_cli = AppGroup('db')
+app.cli.add_command(db_cli)
+
+
+@db_cli.command('upgrade')
+def upgrade_database():
+    applied = upgrade(db.session.connection())
+    if applied and module_summaries_missing():
+        rebuild_module_summaries()
+    db.session.commit()
+    for migration in applied:
+        print(f"Applied {migration.version}: {migration.description}")
+    indexed = ensure_search_index()
+    if indexed is not None:
+        print(f"Created the {get_search_index().name} search index for {indexed} modules")
+    if not applied and indexed is None:
+        print("Database is up to date")
+
+
+@db_cli.command('status')
+def database_status():
+    pending = pending_migrations(db.session.connection())
+    db.session.commit()
+    for migration in pending:
+        print(f"Pending {migration.version}: {migration.description}")
+    if not pending:
+        print("Database is up to date")
+
+
+def plan_checks():
+    facet_index = get_facet_index()
+    area = next(iter(facet_index.ids['area']), '')
+    unit = next(iter(facet_index.ids['unit']), '')
+    keyword = next(iter(facet_index.ids['keyword']), '')
+    per_page = app.config.get("MODULES_PER_PAGE", 25)
+    checks = [("modules listing", search_modules(), ['ix_modules_date_added_id']),
+              ("modules by area", search_modules(selected={'area': [area]}), ['ix_module_units_unit_id_module_id']),
+              ("modules by unit", search_modules(selected={'unit': [unit]}), ['ix_module_units_unit_id_module_id']),
+              ("modules by keyword", search_modules(selected={'keyword': [keyword]}),
+               ['ix_module_keywords_keyword_id_module_id'])]
+    for name, (modules_query, ordering), indexes in checks:
+        yield name, keyset_query(modules_query, ordering, per_page=per_page).statement, indexes
+    yield "module files", File.query.filter(File.module_id == 1).statement, ['ix_files_module_id']
+    yield "area units", Unit.query.filter(Unit.area_id == 1).statement, ['ix_units_area_id']
+    yield "modules by author", Module.query.filter(Module.author == '').statement, ['ix_modules_author']
+
+
+@db_cli.command('explain')
+@click.option('--verbose', '-v', is_flag=True, help="Print the full query plans")
+def explain_queries(verbose):
+    failures = 0
+    for name, statement, indexes in plan_checks():
+        passed, plan = check_plan(db.session, statement, indexes)
+        failures += not passed
+        print(f"{'OK' if passed else 'MISSING'} {name} ({', '.join(indexes)})")
+        if verbose or not passed:
+            for line in plan:
+                print(f"    {line}")
+    db.session.rollback()
+    if failures:
+        raise SystemExit(f"{failures} queries do not use their indexes, run `flask db upgrade`")
+
+
+vocabulary_cli = AppGroup('vocabulary')
+app.cli.add_command(vocabulary_cli)
+
+
+def print_vocabulary_diff(diff, verbose=False):
+    for name in diff.duplicates:
+        print(f"Duplicate entry {name}, the last one was used")
+    if not diff.changed:
+        print("Vocabulary is up to date")
+        return
+    for line in diff.summary():
+        print(line)
+    if verbose:
+        for line in diff.details():
+            print(line)
+
+
+@vocabulary_cli.command('load')
+@click.option('--areas', 'area_units_path', default=AREA_UNITS_PATH, show_default=True,
+              help="JSON file mapping areas to their units")
+@click.option('--keywords', 'keywords_path', default=KEYWORDS_PATH, show_default=True,
+              help="Keyword CSV (name, sources...) or JSON file")
+@click.option('--prune', is_flag=True, help="Delete areas, units, keywords and sources missing from the files")
+@click.option('--dry-run', is_flag=True, help="Report the changes without saving them")
+@click.option('--verbose', '-v', is_flag=True, help="List every added, updated and removed entry")
+def load_vocabulary_command(area_units_path, keywords_path, prune, dry_run, verbose):
+    print_vocabulary_diff(load_vocabulary(area_units_path, keywords_path, prune, dry_run), verbose or dry_run)
+    if dry_run:
+        print("Dry run, no changes were saved")
+
+
+@app.cli.command('reindex')
+def reindex():
+    count = rebuild_search_index()["indexed"]
+    print(f"Indexed {count} modules with the {get_search_index().name} search index")
+
+
+jobs_cli = AppGroup('jobs')
+app.cli.add_command(jobs_cli)
+
+
+@jobs_cli.command('enqueue')
+@click.argument('name')
+@click.option('--payload', default='{}', help="JSON keyword arguments for the job")
+def enqueue_job(name, payload):
+    if name not in job_runner.handlers:
+        raise click.BadParameter(f"choose from {', '.join(sorted(job_runner.handlers))}", param_hint='NAME')
+    job = job_runner.enqueue(name, json.loads(payload), submit=False)
+    print(f"Queued job {job.id} ({name}), run it with flask jobs work")
+
+
+@jobs_cli.command('work')
+@click.option('--requeue-running', is_flag=True, help="Retry jobs left running by a stopped process")
+def work_jobs(requeue_running):
+    if requeue_running:
+        print(f"Requeued {job_runner.requeue_running()} jobs")
+    print(f"Processed {job_runner.work()} jobs")
+
+
+@jobs_cli.command('list')
+@click.option('--limit', default=20, show_default=True)
+def list_jobs(limit):
+    for job in Job.query.order_by(Job.id.desc()).limit(limit):
+        print(f"{job.id:>6} {job.name:<12} {job.status:<9} {job.created_at:%Y-%m-%d %H:%M:%S} {job.key or ''}")
+
+
+users_cli = AppGroup('users')
+app.cli.add_command(users_cli)
+
+
+@users_cli.command('password')
+@click.argument('username')
+@click.password_option()
+def change_password(username, password):
+    user = User.query.filter(User.username == username).first()
+    if not user:
+        raise click.BadParameter(f"no user named {username!r}", param_hint='USERNAME')
+    user.password = generate_password_hash(password)
+    db.session.commit()
+    invalidate_sessions(user.id)
+    print(f"Changed the password of {username} and signed out their sessions")
+
+
+summaries_cli = AppGroup('summaries')
+app.cli.add_command(summaries_cli)
+
+
+@summaries_cli.command('rebuild')
+@click.option('--batch-size', default=500, show_default=True)
+def rebuild_summaries(batch_size):
+    count = rebuild_module_summaries(batch_size)
+    db.session.commit()
+    invalidate_pages()
+    print(f"Rebuilt {count} module summaries")
+
+
+cache_cli = AppGroup('cache')
+app.cli.add_command(cache_cli)
+
+
+@cache_cli.command('clear')
+def clear_cache():
+    invalidate_pages()
+    print("Cleared cached pages and module cards")
+
+
+assets_cli = AppGroup('assets')
+app.cli.add_command(assets_cli)
+
+
+@assets_cli.command('build')
+def build_static_assets():
+    manifest = build_assets(app.static_folder)
+    invalidate_pages()
+    print(f"Built {len(manifest)} static assets into {os.path.join(app.static_folder, DIST_DIRECTORY)}")
+
+
+archives_cli = AppGroup('archives')
+app.cli.add_command(archives_cli)
+
+
+@archives_cli.command('warm')
+@click.option('--summary', 'summary_path', type=click.Path(exists=True, dir_okay=False),
+              help="Only build the most downloaded archives listed in a flask logs analyze summary")
+def warm_archives(summary_path):
+    if summary_path:
+        with open(summary_path, 'r') as file:
+            module_ids = [archive["module_id"] for archive in json.load(file)["archives"]]
+    else:
+        module_ids = [row.id for row in db.session.query(Module.id).filter(Module.files.any()).order_by(Module.id)]
+    built = 0
+    for module_id in module_ids:
+        built += build_module_archive(module_id)["built"]
+    print(f"Built {built} module archives in {get_archive_cache().path}")
+
+
+logs_cli = AppGroup('logs')
+app.cli.add_command(logs_cli)
+
+
+@logs_cli.command('analyze')
+@click.argument('paths', nargs=-1, type=click.Path(exists=True, dir_okay=False))
+@click.option('--output', help="Summary file to write (defaults to LOG_SUMMARY_PATH)")
+@click.option('--top', default=20, show_default=True, help="Downloads, archives and searches to keep")
+def analyze_logs(paths, output, top):
+    paths = sorted(paths or glob.glob(app.config.get("ACCESS_LOG_PATHS", '/var/log/nginx/access.log*')),
+                   key=os.path.getmtime)
+    if not paths:
+        raise SystemExit("No access logs found, pass their paths or set ACCESS_LOG_PATHS")
+    log_summary = LogSummary(app.url_map, max(top * 50, 1000)).consume(paths)
+    file_ids = [file_id for file_id, _ in log_summary.downloads.most_common(top)]
+    module_ids = [module_id for module_id, _ in log_summary.archives.most_common(top)]
+    file_names = dict(db.session.query(File.id, File.name).filter(File.id.in_(file_ids))) if file_ids else {}
+    module_names = dict(db.session.query(Module.id, Module.name).filter(Module.id.in_(module_ids))) \
+        if module_ids else {}
+    summary = log_summary.as_dict(top, file_names, module_names)
+    output = output or app.config.get("LOG_SUMMARY_PATH", os.path.join(app.instance_path, 'log-summary.json'))
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as file:
+        json.dump(summary, file, separators=(',', ':'))
+    print_log_summary(summary, paths)
+    print(f"Wrote {output}")
+
+
+def print_log_summary(summary, paths):
+    print(f"{summary['requests']} requests ({summary['bytes']} bytes) in {len(paths)} logs from "
+          f"{summary['period']['first']} to {summary['period']['last']}, {summary['malformed']} lines skipped")
+    print(f"{'route':<40}{'requests':>10}{'errors':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'bytes':>14}")
+    for route, stats in summary["routes"].items():
+        print(f"{route:<40}{stats['requests']:>10}{stats['errors']:>8}{str(stats['p50_ms']):>9}"
+              f"{str(stats['p95_ms']):>9}{str(stats['p99_ms']):>9}{stats['bytes']:>14}")
+    for title, rows, key in (("Top downloads", summary["downloads"], "file_id"),
+                             ("Top archives", summary["archives"], "module_id")):
+        print(title)
+        for row in rows:
+            print(f"{row['requests']:>8} {row['bytes']:>14} {row[key]:>8} {row['name'] or '(deleted)'}")
+    print("Top searches")
+    for row in summary["searches"]:
+        print(f"{row['requests']:>8} {row['term']}")
+
+
+storage_cli = AppGroup('storage')
+app.cli.add_command(storage_cli)
+
+
+@storage_cli.command('fsck')
+@click.option('--reclaim', is_flag=True, help="Delete orphaned files, stale uploads and rows without data")
+@click.option('--full', is_flag=True, help="Hash every file, not only the ones changed since the last run")
+@click.option('--workers', type=int, default=None, help="Hashing processes (defaults to the CPU count)")
+@click.option('--grace-hours', type=float, default=24, show_default=True,
+              help="Leave files and unattached rows younger than this alone")
+@click.option('--batch-size', default=1000, show_default=True)
+@click.option('--verbose', '-v', is_flag=True, help="List every problem found")
+def fsck_storage(reclaim, full, workers, grace_hours, batch_size, verbose):
+    blob_store = get_blob_store()
+    state = FsckState(app.config.get("FSCK_STATE_PATH", os.path.join(app.instance_path, 'fsck-state.json')))
+    report = check_storage(db.session, File, blob_store, state, batch_size, workers, grace_hours * 3600, full)
+    state.save()
+    for line in report.summary():
+        print(line)
+    if verbose:
+        for line in report.details():
+            print(line)
+    if reclaim:
+        reclaim_storage(db.session, File, blob_store, report, batch_size)
+        if report.reclaimed_rows:
+            invalidate_pages()
+        print(f"Reclaimed {report.reclaimed_files} files ({report.reclaimed_bytes} bytes) "
+              f"and deleted {report.reclaimed_rows} file rows")
+    if report.corrupt:
+        raise SystemExit(f"{len(report.corrupt)} stored files do not match their checksum")
 
 
 class User(UserMixin, db.Model):
@@ -64,6 +386,20 @@ class User(UserMixin, db.Model):
     username = db.Column(db.String(24), unique=True)
     email = db.Column(db.String(100), unique=True)
     password = db.Column(db.String(80))
+    session_version = db.Column(db.Integer(), nullable=False, default=0, server_default='0')
+
+    def get_id(self):
+        return f"{self.id}:{self.session_version or 0}"
+
+
+class SessionUser(UserMixin):
+    def __init__(self, id, username, session_version):
+        self.id = id
+        self.username = username
+        self.session_version = session_version
+
+    def get_id(self):
+        return f"{self.id}:{self.session_version}"
 
 
 class Area(db.Model):
@@ -81,15 +417,16 @@ class Unit(db.Model):
     __tablename__ = 'units'
     id = db.Column(db.Integer(), primary_key=True)
     name = db.Column(db.String(100), unique=True)
-    area_id = db.Column(db.Integer(), db.ForeignKey('areas.id', ondelete='CASCADE'))
+    area_id = db.Column(db.Integer(), db.ForeignKey('areas.id', ondelete='CASCADE'), index=True)
 
 
 class Module(db.Model):
     __tablename__ = 'modules'
+    __table_args__ = (db.Index('ix_modules_date_added_id', 'date_added', 'id'),)
     id = db.Column(db.Integer(), primary_key=True)
     name = db.Column(db.String(100), unique=True)
-    author = db.Column(db.String(100))
-    date_added = db.Column(db.Date, default=date.today())
+    author = db.Column(db.String(100), index=True)
+    date_added = db.Column(db.Date, default=date.today)
     date_updated = db.Column(db.Date)
     description = db.Column(db.String(8192))
     notes = db.Column(db.String(8192))
@@ -97,13 +434,13 @@ class Module(db.Model):
         'Unit',
         backref=db.backref('modules', lazy='dynamic'),
         secondary='module_units',
-        lazy='dynamic'
+        lazy='select'
     )
     keywords = db.relationship(
         'Keyword',
         backref=db.backref('modules', lazy='dynamic'),
         secondary='module_keywords',
-        lazy='dynamic'
+        lazy='select'
     )
     files = db.relationship(
         'File',
@@ -114,29 +451,58 @@ class Module(db.Model):
         'Link',
         backref=db.backref('modules', lazy='dynamic'),
         secondary='module_links',
-        lazy='dynamic'
+        lazy='select'
     )
 
 
+class ModuleSummary(db.Model):
+    __tablename__ = 'module_summary'
+    module_id = db.Column(db.Integer(), db.ForeignKey('modules.id', ondelete='CASCADE'), primary_key=True)
+    name = db.Column(db.String(100))
+    author = db.Column(db.String(100))
+    description = db.Column(db.String(8192))
+    area = db.Column(db.String(100))
+    units = db.Column(db.Text())
+    keywords = db.Column(db.Text())
+    effective_date = db.Column(db.Date)
+
+    @property
+    def unit_names(self):
+        return json.loads(self.units or '[]')
+
+    @property
+    def keyword_names(self):
+        return json.loads(self.keywords or '[]')
+
+
+class FacetChange(db.Model):
+    __tablename__ = 'facet_changes'
+    id = db.Column(db.Integer(), primary_key=True)
+    module_id = db.Column(db.Integer())
+
+
 module_units = db.Table('module_units',
                         db.Column('module_id', db.Integer(), db.ForeignKey('modules.id', ondelete='CASCADE'),
                                   primary_key=True),
                         db.Column('unit_id', db.Integer(), db.ForeignKey('units.id', ondelete='CASCADE'),
-                                  primary_key=True)
+                                  primary_key=True),
+                        db.Index('ix_module_units_unit_id_module_id', 'unit_id', 'module_id')
                         )
 
 module_keywords = db.Table('module_keywords',
                            db.Column('module_id', db.Integer(), db.ForeignKey('modules.id', ondelete='CASCADE'),
                                      primary_key=True),
                            db.Column('keyword_id', db.Integer(), db.ForeignKey('keywords.id', ondelete='CASCADE'),
-                                     primary_key=True)
+                                     primary_key=True),
+                           db.Index('ix_module_keywords_keyword_id_module_id', 'keyword_id', 'module_id')
                            )
 
 module_links = db.Table('module_links',
                         db.Column('module_id', db.Integer(), db.ForeignKey('modules.id', ondelete='CASCADE'),
                                   primary_key=True),
                         db.Column('link_id', db.Integer(), db.ForeignKey('links.id', ondelete='CASCADE'),
-                                  primary_key=True)
+                                  primary_key=True),
+                        db.Index('ix_module_links_link_id_module_id', 'link_id', 'module_id')
                         )
 
 
@@ -157,7 +523,8 @@ keyword_sources = db.Table('keyword_sources',
                            db.Column('keyword_id', db.Integer(), db.ForeignKey('keywords.id', ondelete='CASCADE'),
                                      primary_key=True),
                            db.Column('source_id', db.Integer(), db.ForeignKey('sources.id', ondelete='CASCADE'),
-                                     primary_key=True)
+                                     primary_key=True),
+                           db.Index('ix_keyword_sources_source_id_keyword_id', 'source_id', 'keyword_id')
                            )
 
 
@@ -171,8 +538,11 @@ class File(db.Model):
     __tablename__ = 'files'
     id = db.Column(db.Integer(), primary_key=True)
     name = db.Column(db.String(200))
-    date_added = db.Column(db.Date, default=date.today())
-    module_id = db.Column(db.Integer(), db.ForeignKey('modules.id', ondelete='CASCADE'))
+    date_added = db.Column(db.Date, default=date.today)
+    created_at = db.Column(db.DateTime(), default=datetime.utcnow)
+    sha256 = db.Column(db.String(64), index=True)
+    size = db.Column(db.BigInteger())
+    module_id = db.Column(db.Integer(), db.ForeignKey('modules.id', ondelete='CASCADE'), index=True)
 
 
 class Link(db.Model):
@@ -181,18 +551,626 @@ class Link(db.Model):
     url = db.Column(db.String(300), unique=True)
 
 
+class Job(db.Model):
+    __tablename__ = 'jobs'
+    __table_args__ = (db.Index('ix_jobs_status_name_key', 'status', 'name', 'key'),)
+    id = db.Column(db.Integer(), primary_key=True)
+    name = db.Column(db.String(50))
+    key = db.Column(db.String(200))
+    status = db.Column(db.String(20))
+    payload = db.Column(db.Text())
+    result = db.Column(db.Text())
+    error = db.Column(db.Text())
+    created_at = db.Column(db.DateTime())
+    started_at = db.Column(db.DateTime())
+    finished_at = db.Column(db.DateTime())
+
+
+job_runner = JobRunner(app, db, Job, app.config.get("JOB_WORKERS", 1), app.config.get("JOBS_SYNCHRONOUS", False))
+
+
+def get_asset_manifest():
+    stamp = manifest_stamp(app.static_folder)
+    cached = app.extensions.get('asset_manifest')
+    if cached is None or cached[0] != stamp:
+        cached = app.extensions['asset_manifest'] = (stamp, load_manifest(app.static_folder))
+    return cached[1]
+
+
+def get_response_cache():
+    if 'response_cache' not in app.extensions:
+        app.extensions['response_cache'] = create_response_cache(app.config, app.instance_path)
+    return app.extensions['response_cache']
+
+
+def cached_page(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if current_user.is_authenticated:
+            return view(*args, **kwargs)
+        response_cache = get_response_cache()
+        query = sorted((name, value.strip()) for name, value in request.args.items(multi=True) if value.strip())
+        key = response_cache.key('page', request.endpoint, sorted(kwargs.items()), query)
+        cached = response_cache.get(key)
+        if cached:
+            body, status, mimetype = cached
+            response = Response(body, status=status, mimetype=mimetype)
+            response.headers['X-Cache'] = 'HIT'
+            return response
+        response = make_response(view(*args, **kwargs))
+        if response.status_code == 200 and not response.direct_passthrough:
+            response_cache.set(key, (response.get_data(), response.status_code, response.mimetype))
+        response.headers['X-Cache'] = 'MISS'
+        return response
+    return wrapper
+
+
+def module_cards(module_ids):
+    response_cache = get_response_cache()
+    keys = [response_cache.key('card', module_id) for module_id in module_ids]
+    cards = dict(zip(keys, response_cache.get_many(keys)))
+    missing = [module_id for key, module_id in zip(keys, module_ids) if cards[key] is None]
+    if missing:
+        summaries = {summary.module_id: summary
+                     for summary in ModuleSummary.query.filter(ModuleSummary.module_id.in_(missing))}
+        unsummarized = [module_id for module_id in missing if module_id not in summaries]
+        if unsummarized:
+            summaries.update((row["module_id"], ModuleSummary(**row)) for row in module_summary_rows(unsummarized))
+        for module_id, summary in summaries.items():
+            key = response_cache.key('card', module_id)
+            cards[key] = render_template('module_card.html', summary=summary)
+            response_cache.set(key, cards[key])
+    return [Markup(cards[key]) for key in keys if cards[key] is not None]
+
+
+def module_summary_rows(module_ids):
+    summaries = {row.id: {"module_id": row.id, "name": row.name, "author": row.author,
+                          "description": row.description, "area": None, "units": [], "keywords": [],
+                          "effective_date": row.date_updated or row.date_added}
+                 for row in db.session.query(Module.id, Module.name, Module.author, Module.description,
+                                             Module.date_added, Module.date_updated)
+                 .filter(Module.id.in_(module_ids))}
+    unit_rows = db.session.query(module_units.c.module_id, Unit.name, Area.name) \
+        .join(Unit, Unit.id == module_units.c.unit_id) \
+        .outerjoin(Area, Area.id == Unit.area_id) \
+        .filter(module_units.c.module_id.in_(module_ids)) \
+        .order_by(Unit.name)
+    for module_id, unit_name, area_name in unit_rows:
+        summaries[module_id]["units"].append(unit_name)
+        if summaries[module_id]["area"] is None:
+            summaries[module_id]["area"] = area_name
+    keyword_rows = db.session.query(module_keywords.c.module_id, Keyword.name, Keyword.acronym) \
+        .join(Keyword, Keyword.id == module_keywords.c.keyword_id) \
+        .filter(module_keywords.c.module_id.in_(module_ids)) \
+        .order_by(Keyword.name)
+    for module_id, keyword_name, acronym in keyword_rows:
+        summaries[module_id]["keywords"].append([keyword_name, acronym or ''])
+    for summary in summaries.values():
+        summary["units"] = json.dumps(summary["units"])
+        summary["keywords"] = json.dumps(summary["keywords"])
+    return list(summaries.values())
+
+
+def refresh_module_summaries(module_ids, batch_size=500):
+    module_ids = list(module_ids)
+    db.session.flush()
+    for start in range(0, len(module_ids), batch_size):
+        batch = module_ids[start:start + batch_size]
+        db.session.execute(ModuleSummary.__table__.delete().where(ModuleSummary.module_id.in_(batch)))
+        rows = module_summary_rows(batch)
+        if rows:
+            db.session.execute(ModuleSummary.__table__.insert(), rows)
+    return len(module_ids)
+
+
+def module_summaries_missing():
+    return modules_exist() and not db.session.query(ModuleSummary.query.exists()).scalar()
+
+
+def rebuild_module_summaries(batch_size=500):
+    db.session.execute(ModuleSummary.__table__.delete())
+    return refresh_module_summaries([row.id for row in db.session.query(Module.id).order_by(Module.id)], batch_size)
+
+
+def invalidate_pages():
+    get_response_cache().invalidate()
+
+
+def get_search_index():
+    if 'search_index' not in app.extensions:
+        app.extensions['search_index'] = create_search_index(db.engine, app.config.get("SEARCH_BACKEND"))
+    return app.extensions['search_index']
+
+
+def ensure_search_index():
+    search_index = get_search_index()
+    if search_index.exists(db.session.connection()):
+        return None
+    count = search_index.rebuild(db.session, iter_module_documents())
+    db.session.commit()
+    return count
+
+
+def module_documents(module_ids):
+    documents = {row.id: {"id": row.id, "name": row.name, "author": row.author, "description": row.description,
+                          "notes": row.notes, "units": [], "keywords": []}
+                 for row in db.session.query(Module.id, Module.name, Module.author, Module.description, Module.notes)
+                 .filter(Module.id.in_(module_ids))}
+    unit_rows = db.session.query(module_units.c.module_id, Unit.name, Area.name) \
+        .join(Unit, Unit.id == module_units.c.unit_id) \
+        .outerjoin(Area, Area.id == Unit.area_id) \
+        .filter(module_units.c.module_id.in_(module_ids))
+    for module_id, unit_name, area_name in unit_rows:
+        documents[module_id]["units"].extend(name for name in (unit_name, area_name) if name)
+    keyword_rows = db.session.query(module_keywords.c.module_id, Keyword.name, Keyword.acronym) \
+        .join(Keyword, Keyword.id == module_keywords.c.keyword_id) \
+        .filter(module_keywords.c.module_id.in_(module_ids))
+    for module_id, keyword_name, acronym in keyword_rows:
+        documents[module_id]["keywords"].extend(name for name in (keyword_name, acronym) if name)
+    for document in documents.values():
+        document["units"] = ' '.join(dict.fromkeys(document["units"]))
+        document["keywords"] = ' '.join(document["keywords"])
+    return list(documents.values())
+
+
+def iter_module_documents(batch_size=500):
+    module_ids = [row.id for row in db.session.query(Module.id).order_by(Module.id)]
+    for start in range(0, len(module_ids), batch_size):
+        yield from module_documents(module_ids[start:start + batch_size])
+
+
+def index_module(module_to_index):
+    db.session.flush()
+    get_search_index().index(db.session, module_documents([module_to_index.id]))
+
+
+def get_archive_cache():
+    if 'archive_cache' not in app.extensions:
+        app.extensions['archive_cache'] = ArchiveCache(
+            app.config.get("ARCHIVE_CACHE_PATH", os.path.join(app.instance_path, 'archives')),
+            app.config.get("ARCHIVE_CACHE_MAX_BYTES", 2 * 1024 ** 3))
+    return app.extensions['archive_cache']
+
+
+def get_blob_store():
+    if 'blob_store' not in app.extensions:
+        app.extensions['blob_store'] = BlobStore(app.config["UPLOAD_PATH"],
+                                                 app.config.get("UPLOAD_CHUNK_SIZE", UPLOAD_CHUNK_SIZE))
+    return app.extensions['blob_store']
+
+
+class UploadRequest(Request):
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return get_blob_store().spool()
+
+
+app.request_class = UploadRequest
+
+
+def module_archive_entries(module_to_zip):
+    return [(file.name, get_blob_store().path_for_file(file))
+            for file in sorted(module_to_zip.files, key=lambda file: file.id)]
+
+
+def get_facet_generation():
+    if 'facet_generation' not in app.extensions:
+        app.extensions['facet_generation'] = create_generation(
+            get_response_cache(),
+            app.config.get("FACET_GENERATION_PATH", os.path.join(app.instance_path, 'facet_generation')),
+            'facet_generation')
+    return app.extensions['facet_generation']
+
+
+def record_facet_changes(module_ids=(None,)):
+    db.session.execute(FacetChange.__table__.insert(), [{"module_id": module_id} for module_id in module_ids])
+    newest = db.session.query(func.max(FacetChange.id)).scalar()
+    db.session.execute(FacetChange.__table__.delete()
+                       .where(FacetChange.id <= newest - app.config.get("FACET_CHANGE_LOG_SIZE", 1000)))
+
+
+def invalidate_facets():
+    get_facet_generation().bump()
+
+
+def latest_facet_change():
+    return db.session.query(func.coalesce(func.max(FacetChange.id), 0)).scalar()
+
+
+def build_facet_index():
+    change_id = latest_facet_change()
+    return FacetIndex([row.id for row in db.session.query(Module.id)],
+                      db.session.query(Area.id, Area.name).all(),
+                      {row.id: (row.name, row.area_id) for row in db.session.query(Unit.id, Unit.name, Unit.area_id)},
+                      db.session.query(Keyword.id, Keyword.name).all(),
+                      db.session.query(module_units.c.module_id, module_units.c.unit_id).all(),
+                      db.session.query(module_keywords.c.module_id, module_keywords.c.keyword_id).all(),
+                      change_id)
+
+
+def apply_facet_changes(facet_index):
+    since = facet_index.change_id - app.config.get("FACET_CHANGE_OVERLAP", 20)
+    newest = latest_facet_change()
+    if newest < facet_index.change_id or newest - app.config.get("FACET_CHANGE_LOG_SIZE", 1000) > since:
+        return False
+    changes = db.session.query(FacetChange.id, FacetChange.module_id).filter(FacetChange.id > since).all()
+    if any(change.module_id is None and change.id > facet_index.change_id for change in changes):
+        return False
+    module_ids = {change.module_id for change in changes if change.module_id is not None}
+    if module_ids:
+        existing = {row.id for row in db.session.query(Module.id).filter(Module.id.in_(module_ids))}
+        unit_ids = {module_id: [] for module_id in module_ids}
+        keyword_ids = {module_id: [] for module_id in module_ids}
+        for module_id, unit_id in db.session.query(module_units.c.module_id, module_units.c.unit_id) \
+                .filter(module_units.c.module_id.in_(module_ids)):
+            unit_ids[module_id].append(unit_id)
+        for module_id, keyword_id in db.session.query(module_keywords.c.module_id, module_keywords.c.keyword_id) \
+                .filter(module_keywords.c.module_id.in_(module_ids)):
+            keyword_ids[module_id].append(keyword_id)
+        for module_id in module_ids:
+            facet_index.update_module(module_id, unit_ids[module_id], keyword_ids[module_id],
+                                      exists=module_id in existing)
+    facet_index.change_id = max([newest] + [change.id for change in changes])
+    return True
+
+
+def get_facet_index():
+    generation = get_facet_generation().current()
+    vocabulary_generation = get_vocabulary_generation().current()
+    cached = app.extensions.get('facet_index')
+    if cached is None or cached[:2] != (generation, vocabulary_generation):
+        facet_index = cached[2] if cached is not None and cached[1] == vocabulary_generation else None
+        if facet_index is None or not apply_facet_changes(facet_index):
+            facet_index = build_facet_index()
+        cached = app.extensions['facet_index'] = (generation, vocabulary_generation, facet_index)
+    return cached[2]
+
+
+def get_vocabulary_generation():
+    if 'vocabulary_generation' not in app.extensions:
+        app.extensions['vocabulary_generation'] = create_generation(
+            get_response_cache(),
+            app.config.get("VOCABULARY_GENERATION_PATH", os.path.join(app.instance_path, 'vocabulary_generation')),
+            'vocabulary_generation')
+    return app.extensions['vocabulary_generation']
+
+
+def invalidate_vocabulary():
+    get_vocabulary_generation().bump()
+
+
+def get_vocabulary_snapshot():
+    generation = get_vocabulary_generation().current()
+    cached = app.extensions.get('vocabulary_snapshot')
+    if cached is None or cached[0] != generation:
+        snapshot = read_vocabulary_snapshot(db.session.connection(), Area.__table__, Unit.__table__,
+                                            Keyword.__table__)
+        cached = app.extensions['vocabulary_snapshot'] = (generation, snapshot)
+    return cached[1]
+
+
+def get_suggestion_index():
+    generation = get_vocabulary_generation().current()
+    cached = app.extensions.get('suggestion_index')
+    if cached is None or cached[0] != generation:
+        entries = [('area', row.name, row.name) for row in db.session.query(Area.name)]
+        entries += [('unit', row.name, row.name) for row in db.session.query(Unit.name)]
+        for row in db.session.query(Keyword.name, Keyword.acronym):
+            entries.append(('keyword', row.name, row.name))
+            if row.acronym:
+                entries.append(('acronym', row.acronym, row.name))
+        cached = app.extensions['suggestion_index'] = (generation, SuggestionIndex(entries))
+    return cached[1]
+
+
+def ranked_search(search_term):
+    alternatives = get_suggestion_index().expand(search_term) if app.config.get("FUZZY_SEARCH", True) else []
+    return get_search_index().ranked(search_term, alternatives)
+
+
+def selected_facets():
+    return {facet: list(dict.fromkeys(value for value in request.args.getlist(facet) if value != ''))
+            for facet in FACETS}
+
+
+def search_modules(search_term=None, selected=None):
+    selected = selected or {}
+    facet_index = get_facet_index()
+    modules_query = Module.query
+    ordering = [(Module.date_added, True), (Module.id, True)]
+    if selected.get('area'):
+        modules_query = modules_query.filter(Module.id.in_(
+            db.session.query(module_units.c.module_id)
+            .filter(module_units.c.unit_id.in_(facet_index.unit_ids_for_areas(selected['area'])))))
+    if selected.get('unit'):
+        modules_query = modules_query.filter(Module.id.in_(
+            db.session.query(module_units.c.module_id)
+            .filter(module_units.c.unit_id.in_(facet_index.value_ids('unit', selected['unit'])))))
+    if selected.get('keyword'):
+        modules_query = modules_query.filter(Module.id.in_(
+            db.session.query(module_keywords.c.module_id)
+            .filter(module_keywords.c.keyword_id.in_(facet_index.value_ids('keyword', selected['keyword'])))))
+    if search_term and search_term != '':
+        ranked = ranked_search(search_term)
+        if ranked is not None:
+            modules_query = modules_query.join(ranked, ranked.c.module_id == Module.id)
+            ordering = [(ranked.c.rank, False)] + ordering
+    return modules_query, ordering
+
+
+def facet_counts(search_term, selected):
+    base = None
+    if search_term and search_term != '':
+        ranked = ranked_search(search_term)
+        if ranked is not None:
+            base = bitmap_from_ids(row.module_id for row in db.session.query(ranked.c.module_id))
+    return get_facet_index().counts(selected, base, limit=app.config.get("FACET_KEYWORD_LIMIT", 25))
+
+
+def render_module_listing(template):
+    search_term = request.args.get('search')
+    if not modules_exist():
+        return render_template(template)
+    selected = selected_facets()
+    modules_query, ordering = search_modules(search_term, selected)
+    page = paginate_modules(modules_query.with_entities(Module.id), ordering)
+    return render_template(template,
+                           cards=module_cards(page.items),
+                           page=page,
+                           facets=facet_counts(search_term, selected),
+                           selected=selected,
+                           search=search_term)
+
+
+def modules_exist():
+    return db.session.query(Module.query.exists()).scalar()
+
+
+def paginate_modules(modules_query, ordering):
+    total = modules_query.with_entities(func.count(Module.id)).scalar()
+    try:
+        return keyset_paginate(modules_query, ordering, request.args.get('cursor'),
+                               app.config.get("MODULES_PER_PAGE", 25), total=total)
+    except InvalidCursor:
+        abort(400)
+
+
+def page_url(cursor=None):
+    args = request.args.to_dict(flat=False)
+    args.pop('cursor', None)
+    if cursor:
+        args['cursor'] = cursor
+    return url_for(request.endpoint, **args)
+
+
+def facet_url(facet=None, value=None):
+    args = request.args.to_dict(flat=False)
+    args.pop('cursor', None)
+    if facet is None:
+        for name in FACETS:
+            args.pop(name, None)
+    else:
+        values = args.get(facet, [])
+        args[facet] = [other for other in values if other != value] if value in values else values + [value]
+    return url_for(request.endpoint, **args)
+
+
+MODULE_FIELDS = ('id', 'name', 'author', 'date_added', 'date_updated', 'description', 'notes', 'units', 'keywords',
+                 'files', 'links')
+MODULE_LIST_FIELDS = ('id', 'name', 'author', 'date_added', 'date_updated', 'units', 'keywords')
+KEYWORD_FIELDS = ('id', 'name', 'acronym', 'sources')
+AREA_FIELDS = ('id', 'name', 'units')
+
+
+def module_payloads(module_ids, fields):
+    if not module_ids:
+        return []
+    columns = [getattr(Module, field) for field in fields if field in MODULE_FIELDS[1:7]]
+    scalar_fields = ['id'] + [column.key for column in columns]
+    payloads = {row.id: select_fields(row, scalar_fields)
+                for row in db.session.query(Module.id, *columns).filter(Module.id.in_(module_ids))}
+    if 'units' in fields:
+        attach(payloads, 'units',
+               db.session.query(module_units.c.module_id, Unit.id, Unit.name, Area.name)
+               .join(Unit, Unit.id == module_units.c.unit_id)
+               .outerjoin(Area, Area.id == Unit.area_id)
+               .filter(module_units.c.module_id.in_(payloads))
+               .order_by(Unit.name),
+               lambda row: {"id": row[1], "name": row[2], "area": row[3]})
+    if 'keywords' in fields:
+        attach(payloads, 'keywords',
+               db.session.query(module_keywords.c.module_id, Keyword.id, Keyword.name, Keyword.acronym)
+               .join(Keyword, Keyword.id == module_keywords.c.keyword_id)
+               .filter(module_keywords.c.module_id.in_(payloads))
+               .order_by(Keyword.name),
+               lambda row: {"id": row[1], "name": row[2], "acronym": row[3]})
+    if 'files' in fields:
+        attach(payloads, 'files',
+               db.session.query(File.module_id, File.id, File.name, File.size, File.sha256)
+               .filter(File.module_id.in_(payloads))
+               .order_by(File.id),
+               lambda row: {"id": row[1], "name": row[2], "size": row[3], "sha256": row[4],
+                            "url": url_for('download', file_id=row[1])})
+    if 'links' in fields:
+        attach(payloads, 'links',
+               db.session.query(module_links.c.module_id, Link.id, Link.url)
+               .join(Link, Link.id == module_links.c.link_id)
+               .filter(module_links.c.module_id.in_(payloads))
+               .order_by(Link.id),
+               lambda row: {"id": row[1], "url": row[2]})
+    return [payloads[module_id] for module_id in module_ids if module_id in payloads]
+
+
+def keyword_payloads(keyword_ids, fields):
+    if not keyword_ids:
+        return []
+    columns = [getattr(Keyword, field) for field in fields if field in KEYWORD_FIELDS[1:3]]
+    scalar_fields = ['id'] + [column.key for column in columns]
+    payloads = {row.id: select_fields(row, scalar_fields)
+                for row in db.session.query(Keyword.id, *columns).filter(Keyword.id.in_(keyword_ids))}
+    if 'sources' in fields:
+        attach(payloads, 'sources',
+               db.session.query(keyword_sources.c.keyword_id, Source.name)
+               .join(Source, Source.id == keyword_sources.c.source_id)
+               .filter(keyword_sources.c.keyword_id.in_(payloads))
+               .order_by(Source.name),
+               lambda row: row[1])
+    return [payloads[keyword_id] for keyword_id in keyword_ids if keyword_id in payloads]
+
+
+def api_page(id_query, ordering, total=None):
+    per_page = parse_limit(request.args.get('limit'), app.config.get("API_PER_PAGE", 100),
+                           app.config.get("API_MAX_PER_PAGE", 500))
+    try:
+        return keyset_paginate(id_query, ordering, request.args.get('cursor'), per_page, total=total)
+    except InvalidCursor:
+        raise ApiError("Invalid cursor")
+
+
+def api_listing(page, data):
+    return json_response({"data": data, "total": page.total, "next_cursor": page.next_cursor,
+                          "next": page_url(page.next_cursor) if page.has_next else None})
+
+
+def resolve_links(urls):
+    urls = list(dict.fromkeys(urls))
+    if not urls:
+        return []
+    links = {link.url: link for link in Link.query.filter(Link.url.in_(urls))}
+    missing = [url for url in urls if url not in links]
+    if missing:
+        db.session.execute(Link.__table__.insert(), [{"url": url} for url in missing])
+        links.update((link.url, link) for link in Link.query.filter(Link.url.in_(missing)))
+    return [links[url] for url in urls]
+
+
+def save_module(module_to_save, params):
+    module_to_save.name = params["name"]
+    module_to_save.author = params["author"]
+    module_to_save.description = params["description"]
+    module_to_save.notes = params["notes"]
+    module_to_save.units = Unit.query.filter(Unit.id.in_(params["unit_ids"])).all()
+    module_to_save.keywords = Keyword.query.filter(Keyword.id.in_(params["keyword_ids"])).all()
+    module_to_save.links = resolve_links(params["links"].split())
+    db.session.add(module_to_save)
+    db.session.flush()
+    if "retained_file_ids" in params:
+        File.query.filter(File.module_id == module_to_save.id, File.id.notin_(params["retained_file_ids"])) \
+            .update({File.module_id: None}, synchronize_session=False)
+    if params["file_ids"]:
+        File.query.filter(File.id.in_(params["file_ids"]), File.module_id.is_(None)) \
+            .update({File.module_id: module_to_save.id}, synchronize_session=False)
+    index_module(module_to_save)
+    refresh_module_summaries([module_to_save.id])
+    record_facet_changes([module_to_save.id])
+    return module_to_save
+
+
+def discard_unclaimed_files(file_ids):
+    if file_ids:
+        File.query.filter(File.id.in_(file_ids), File.module_id.is_(None)).delete(synchronize_session=False)
+        db.session.commit()
+
+
+@job_runner.task('archive')
+def build_module_archive(module_id):
+    module_to_zip = Module.query.filter(Module.id == module_id).first()
+    if not module_to_zip or not module_to_zip.files:
+        return {"built": False}
+    archive_cache = get_archive_cache()
+    entries = module_archive_entries(module_to_zip)
+    digest = archive_cache.key(module_to_zip.id, entries)
+    if archive_cache.get(module_to_zip.id, digest):
+        return {"built": False, "digest": digest}
+    archive_cache.build(module_to_zip.id, digest, entries, app.config.get("DOWNLOAD_CHUNK_SIZE", CHUNK_SIZE))
+    return {"built": True, "digest": digest}
+
+
+@job_runner.task('checksum')
+def checksum_files(file_ids=None, verify=False):
+    blob_store = get_blob_store()
+    pending = File.query.filter(File.sha256.is_(None))
+    if file_ids is not None:
+        pending = pending.filter(File.id.in_(file_ids))
+    adopted, missing, corrupt = [], [], []
+    for pending_file in pending.order_by(File.id).all():
+        try:
+            pending_file.sha256, pending_file.size = blob_store.adopt(blob_store.legacy_path(pending_file.id))
+        except FileNotFoundError:
+            missing.append(pending_file.id)
+            continue
+        db.session.commit()
+        adopted.append(pending_file.id)
+    if verify:
+        stored = db.session.query(File.id, File.sha256).filter(File.sha256.isnot(None))
+        if file_ids is not None:
+            stored = stored.filter(File.id.in_(file_ids))
+        for file_id, digest in stored:
+            path = blob_store.path_for(digest)
+            if not os.path.isfile(path):
+                missing.append(file_id)
+            elif hash_file(path, blob_store.chunk_size) != digest:
+                corrupt.append(file_id)
+    return {"adopted": adopted, "missing": missing, "corrupt": corrupt}
+
+
+@job_runner.task('reindex')
+def rebuild_search_index():
+    count = get_search_index().rebuild(db.session, iter_module_documents())
+    db.session.commit()
+    invalidate_pages()
+    return {"indexed": count}
+
+
+@job_runner.task('vocabulary')
+def reload_vocabulary(prune=False):
+    return {"changes": load_vocabulary(prune=prune).summary()}
+
+
 class LoginForm(FlaskForm):
     username = StringField('Username', validators=[InputRequired(), Length(max=24)])
     password = PasswordField('Password', validators=[InputRequired(), Length(min=8, max=80)])
     remember = BooleanField('Remember Me')
 
 
+def get_auth_generation():
+    if 'auth_generation' not in app.extensions:
+        app.extensions['auth_generation'] = create_generation(
+            get_response_cache(),
+            app.config.get("AUTH_GENERATION_PATH", os.path.join(app.instance_path, 'auth_generation')),
+            'auth_generation')
+    return app.extensions['auth_generation']
+
+
+def invalidate_sessions(user_id=None):
+    if user_id is not None:
+        User.query.filter(User.id == user_id) \
+            .update({User.session_version: User.session_version + 1}, synchronize_session=False)
+        db.session.commit()
+    get_auth_generation().bump()
+
+
+def load_session_user(session_id):
+    user_id, _, version = session_id.partition(':')
+    user = User.query.get(int(user_id)) if user_id.isdigit() else None
+    if user is None or str(user.session_version) != version:
+        return None
+    return SessionUser(user.id, user.username, user.session_version)
+
+
 @login_manager.user_loader
-def user_loader(user_id):
-    return User.query.get(user_id)
+def user_loader(session_id):
+    generation = get_auth_generation().current()
+    cached = app.extensions.get('session_users')
+    if cached is None or cached[0] != generation or \
+            len(cached[1]) >= app.config.get("SESSION_USER_CACHE_SIZE", 1024):
+        cached = app.extensions['session_users'] = (generation, {})
+    if session_id not in cached[1]:
+        cached[1][session_id] = load_session_user(session_id)
+    return cached[1][session_id]
 
 
 @app.route('/')
+@cached_page
 def index():
     return render_template("index.html")
 
@@ -219,11 +1197,14 @@ def login():
 
 @app.route('/logout')
 def logout():
+    if current_user.is_authenticated:
+        invalidate_sessions(current_user.id)
     logout_user()
     return redirect(url_for('index'))
 
 
 @app.route('/module/<module_id>')
+@cached_page
 def module(module_id):
     selected_module = Module.query.filter(Module.id == module_id).first()
     if selected_module:
@@ -233,36 +1214,93 @@ def module(module_id):
 
 
 @app.route('/modules')
+@cached_page
 def modules():
-    search_term = request.args.get('search')
-    area_term = request.args.get('area')
-    unit_term = request.args.get('unit')
-    keyword_term = request.args.get('keyword')
-    modules_query = Module.query
-    if not modules_query.all():
-        return render_template("modules.html")
-    if area_term and area_term != '':
-        modules_query = modules_query.filter(Module.units.any(Unit.area.has(Area.name == area_term)))
-    if unit_term and unit_term != '':
-        modules_query = modules_query.filter(Module.units.any(Unit.name == unit_term))
-    if keyword_term and keyword_term != '':
-        modules_query = modules_query.filter(Module.keywords.any(Keyword.name == keyword_term))
-    if search_term and search_term != '':
-        modules_query = Module.query.filter(or_(
-            Module.name.ilike(f'%{search_term}%'),
-            Module.units.any(or_(
-                Unit.name.ilike(f'%{search_term}%'),
-                Unit.area.has(Area.name.ilike(f'%{search_term}%'))
-            )),
-            Module.keywords.any(or_(
-                Keyword.name.ilike(f'%{search_term}%'),
-                Keyword.acronym.ilike(f'%{search_term}%')
-            )),
-            Module.author.ilike(f'%{search_term}%')
-        ))
-    return render_template("modules.html",
-                           modules=modules_query.order_by(Module.date_added.desc()).all(),
-                           search=search_term)
+    return render_module_listing("modules.html")
+
+
+@app.route('/api/suggest')
+def suggest():
+    query = request.args.get('q', '')
+    limit = min(request.args.get('limit', 10, type=int), 50)
+    suggestions = get_suggestion_index().suggest(query, limit)
+    for suggestion in suggestions:
+        facet = 'keyword' if suggestion["type"] == 'acronym' else suggestion["type"]
+        suggestion["url"] = url_for('modules', **{facet: suggestion["value"]})
+    return jsonify({"query": query, "suggestions": suggestions})
+
+
+@app.errorhandler(ApiError)
+def api_error(error):
+    return json_response({"error": error.message}, error.status)
+
+
+@app.route('/api/v1/modules')
+@conditional
+@cached_page
+def api_modules():
+    fields = parse_fields(request.args.get('fields'), MODULE_FIELDS, MODULE_LIST_FIELDS)
+    if request.args.get('ids') is not None:
+        module_ids = parse_ids(request.args['ids'], app.config.get("API_MAX_BATCH", 100))
+        return json_response({"data": module_payloads(module_ids, fields)})
+    modules_query, ordering = search_modules(request.args.get('search'), selected_facets())
+    id_query = modules_query.with_entities(Module.id)
+    page = api_page(id_query, ordering, total=id_query.with_entities(func.count(Module.id)).scalar())
+    return api_listing(page, module_payloads(page.items, fields))
+
+
+@app.route('/api/v1/modules/<int:module_id>')
+@conditional
+@cached_page
+def api_module(module_id):
+    payloads = module_payloads([module_id], parse_fields(request.args.get('fields'), MODULE_FIELDS, MODULE_FIELDS))
+    if not payloads:
+        raise ApiError(f"Module {module_id} does not exist", 404)
+    return json_response({"data": payloads[0]})
+
+
+@app.route('/api/v1/areas')
+@conditional
+@cached_page
+def api_areas():
+    fields = parse_fields(request.args.get('fields'), AREA_FIELDS, AREA_FIELDS)
+    payloads = {row.id: select_fields(row, ['id'] + [field for field in fields if field not in ('id', 'units')])
+                for row in db.session.query(Area.id, Area.name).order_by(Area.name)}
+    if 'units' in fields:
+        attach(payloads, 'units',
+               db.session.query(Unit.area_id, Unit.id, Unit.name)
+               .filter(Unit.area_id.isnot(None))
+               .order_by(Unit.name),
+               lambda row: {"id": row[1], "name": row[2]})
+    return json_response({"data": list(payloads.values())})
+
+
+@app.route('/api/v1/keywords')
+@conditional
+@cached_page
+def api_keywords():
+    fields = parse_fields(request.args.get('fields'), KEYWORD_FIELDS, KEYWORD_FIELDS)
+    if request.args.get('ids') is not None:
+        keyword_ids = parse_ids(request.args['ids'], app.config.get("API_MAX_BATCH", 100))
+        return json_response({"data": keyword_payloads(keyword_ids, fields)})
+    id_query = db.session.query(Keyword.id)
+    page = api_page(id_query, [(Keyword.name, False), (Keyword.id, False)],
+                    total=db.session.query(func.count(Keyword.id)).scalar())
+    return api_listing(page, keyword_payloads(page.items, fields))
+
+
+def metrics_allowed():
+    if current_user.is_authenticated or request.remote_addr in app.config.get("METRICS_ALLOWED_IPS", ()):
+        return True
+    token = app.config.get("METRICS_TOKEN")
+    return bool(token) and hmac.compare_digest(request.headers.get('Authorization', ''), f"Bearer {token}")
+
+
+@app.route('/metrics')
+def metrics():
+    if not metrics_allowed():
+        abort(403)
+    return Response(instrumentation.exposition(), mimetype='text/plain; version=0.0.4')
 
 
 @app.route('/contribute')
@@ -274,7 +1312,8 @@ def contribute():
 @login_required
 def upload():
     uploaded_files = request.files.getlist('file')
-    to_save = []
+    new_files = []
+    chunked_uploads = {}
     for file in uploaded_files:
         filename = secure_filename(file.filename)
         if filename != '':
@@ -285,15 +1324,55 @@ def upload():
             else:
                 if ext not in app.config["EXTENSIONS_WHITELIST"]:
                     return 'This type of file is  not allowed', 400
-            new_file = File(name=filename)
-            db.session.add(new_file)
-            to_save.append((file, new_file))
+            if 'dzuuid' in request.form:
+                finished = finished_chunk_upload()
+                if finished:
+                    return json.dumps([finished.id]), 200
+                assembled = receive_chunk(file)
+                if not assembled:
+                    return json.dumps([]), 200
+                new_file = File(name=filename, size=int(request.form['dztotalfilesize']))
+                db.session.add(new_file)
+                db.session.flush()
+                get_blob_store().stage(assembled, new_file.id)
+                chunked_uploads[new_file] = request.form['dzuuid']
+            else:
+                stored = get_blob_store().store(file)
+                new_file = File(name=filename, sha256=stored[0], size=stored[1])
+                db.session.add(new_file)
+            new_files.append(new_file)
         else:
             return '', 204
     db.session.commit()
-    for file in to_save:
-        file[0].save(os.path.join(app.config["UPLOAD_PATH"], str(file[1].id)))
-    return json.dumps([file[1].id for file in to_save]), 200
+    for new_file, upload_id in chunked_uploads.items():
+        get_blob_store().mark_finished(upload_id, new_file.id)
+    for new_file in new_files:
+        if not new_file.sha256:
+            job_runner.enqueue('checksum', {"file_ids": [new_file.id]}, key=f"file:{new_file.id}")
+    return json.dumps([file.id for file in new_files]), 200
+
+
+def finished_chunk_upload():
+    try:
+        file_id = get_blob_store().finished_upload(request.form['dzuuid'])
+    except ValueError:
+        abort(400)
+    return File.query.filter(File.id == file_id).first() if file_id is not None else None
+
+
+def receive_chunk(file):
+    blob_store = get_blob_store()
+    try:
+        upload_id = request.form['dzuuid']
+        index, total_chunks = int(request.form['dzchunkindex']), int(request.form['dztotalchunkcount'])
+        if index >= total_chunks:
+            abort(400)
+        blob_store.write_chunk(upload_id, index, int(request.form['dzchunkbyteoffset']), file)
+        if len(blob_store.received_chunks(upload_id)) < total_chunks:
+            return None
+        return blob_store.finish_chunks(upload_id, int(request.form['dztotalfilesize']), total_chunks)
+    except (KeyError, ValueError):
+        abort(400)
 
 
 @app.route('/download/<file_id>')
@@ -301,8 +1380,34 @@ def download(file_id):
     file_to_download = File.query.filter(File.id == file_id).first()
     if not file_to_download:
         abort(404)
-    return send_from_directory(app.config["UPLOAD_PATH"], str(file_to_download.id), as_attachment=True,
-                               download_name=file_to_download.name)
+    blob_store = get_blob_store()
+    file_path = blob_store.path_for_file(file_to_download)
+    if app.config.get("DOWNLOAD_BACKEND"):
+        return offloaded_response(app.config["DOWNLOAD_BACKEND"], file_path,
+                                  app.config.get("DOWNLOAD_ACCEL_LOCATION", '/_uploads/'), file_to_download.name,
+                                  root=blob_store.root)
+    response = stored_file_response(file_to_download, blob_store)
+    if response is None and not file_to_download.sha256:
+        db.session.refresh(file_to_download)
+        response = stored_file_response(file_to_download, blob_store)
+    if response is None:
+        abort(404)
+    if not file_to_download.sha256:
+        job_runner.enqueue('checksum', {"file_ids": [file_to_download.id]}, key=f"file:{file_to_download.id}")
+    return response
+
+
+def stored_file_response(file, blob_store):
+    file_path = blob_store.path_for_file(file)
+    try:
+        etag = file.sha256
+        if not etag:
+            stat = os.stat(file_path)
+            etag = f"{file.id}-{stat.st_size}-{stat.st_mtime_ns}"
+        return ranged_file_response(request, file_path, etag, file.name,
+                                    chunk_size=app.config.get("DOWNLOAD_CHUNK_SIZE", CHUNK_SIZE))
+    except FileNotFoundError:
+        return None
 
 
 @app.route('/download_all/<module_id>')
@@ -310,14 +1415,24 @@ def download_all(module_id):
     module_to_zip = Module.query.filter(Module.id == module_id).first()
     if not module_to_zip:
         abort(404)
-    files_to_zip = module_to_zip.files
-    zip_bytes = io.BytesIO()
-    with ZipFile(zip_bytes, "a", ZIP_DEFLATED, True) as zip_file:
-        for file in files_to_zip:
-            with open(os.path.join(app.config["UPLOAD_PATH"], str(file.id)), 'rb') as fp:
-                zip_file.writestr(file.name, fp.read())
-    zip_bytes.seek(0)
-    return send_file(zip_bytes, as_attachment=True, download_name=f"{module_to_zip.name.replace(' ', '_')}.zip")
+    archive_cache = get_archive_cache()
+    entries = module_archive_entries(module_to_zip)
+    digest = archive_cache.key(module_to_zip.id, entries)
+    download_name = f"{module_to_zip.name.replace(' ', '_')}.zip"
+    cached_path = archive_cache.get(module_to_zip.id, digest)
+    if cached_path and app.config.get("DOWNLOAD_BACKEND"):
+        return offloaded_response(app.config["DOWNLOAD_BACKEND"], cached_path,
+                                  app.config.get("ARCHIVE_ACCEL_LOCATION", '/_archives/'), download_name,
+                                  'application/zip')
+    if cached_path:
+        return send_file(cached_path, mimetype='application/zip', as_attachment=True, download_name=download_name,
+                         conditional=True, etag=digest)
+    response = Response(archive_cache.stream_and_store(module_to_zip.id, digest, entries,
+                                                       app.config.get("DOWNLOAD_CHUNK_SIZE", CHUNK_SIZE)),
+                        mimetype='application/zip')
+    response.headers.set('Content-Disposition', 'attachment', **attachment_options(download_name))
+    response.set_etag(digest)
+    return response.make_conditional(request)
 
 
 @app.route('/admin')
@@ -326,41 +1441,50 @@ def admin():
     return render_template('admin/index.html')
 
 
+@app.route('/admin/jobs', methods=['GET', 'POST'])
+@login_required
+def jobs():
+    if request.method == 'POST':
+        params = request.get_json() or {}
+        if params.get("name") not in job_runner.handlers:
+            raise ApiError(f"Unknown job {params.get('name')!r}. "
+                           f"Available jobs: {', '.join(sorted(job_runner.handlers))}")
+        job = job_runner.enqueue(params["name"], params.get("payload"), params.get("key"))
+        response = json_response({"data": describe_job(job)}, 202)
+        response.headers['Location'] = url_for('job_status', job_id=job.id)
+        return response
+    limit = parse_limit(request.args.get('limit'), 50, 500)
+    return json_response({"data": [describe_job(job) for job in Job.query.order_by(Job.id.desc()).limit(limit)]})
+
+
+@app.route('/admin/jobs/<int:job_id>')
+@login_required
+def job_status(job_id):
+    job = Job.query.get(job_id)
+    if not job:
+        raise ApiError(f"Job {job_id} does not exist", 404)
+    return json_response({"data": describe_job(job)})
+
+
 @app.route('/admin/add_module', methods=['GET', 'POST'])
 @login_required
 def add_module():
     if request.method == 'GET':
-        keywords = Keyword.query.all()
-        areas = Area.query.all()
-        return render_template('admin/add_module.html', keywords=keywords, areas=areas)
+        vocabulary = get_vocabulary_snapshot()
+        return render_template('admin/add_module.html', keywords=vocabulary.keywords, areas=vocabulary.areas)
     elif request.method == 'POST':
         params = request.get_json()
-        files = File.query.filter(File.id.in_(params["file_ids"])).all()
-        print(files)
-        keywords = Keyword.query.filter(Keyword.id.in_(params["keyword_ids"])).all()
-        print(keywords)
-        units = Unit.query.filter(Unit.id.in_(params["unit_ids"])).all()
-        print(units)
-        links = []
-        for url in params["links"].split():
-            link = Link.query.filter(Link.url == url).first()
-            if not link:
-                link = Link(url=url)
-                db.session.add(link)
-            links.append(link)
-        db.session.commit()
-        print(links)
-        new_module = Module(name=params["name"], author=params["author"], description=params["description"],
-                            notes=params["notes"], units=units, files=files, keywords=keywords, links=links)
         try:
-            db.session.add(new_module)
+            new_module = save_module(Module(), params)
             db.session.commit()
         except sqlalchemy.exc.IntegrityError as err:
             db.session.rollback()
-            for file in files:
-                db.session.delete(file)
-                db.session.commit()
+            discard_unclaimed_files(params["file_ids"])
             return {"code": 500, "data": "", "msg": err.orig.args}
+        invalidate_pages()
+        invalidate_facets()
+        if params["file_ids"]:
+            job_runner.enqueue('archive', {"module_id": new_module.id}, key=f"module:{new_module.id}")
         return {"code": 200, "data": "", "msg": "OK"}
 
 
@@ -368,99 +1492,67 @@ def add_module():
 @login_required
 def edit():
     if request.method == 'GET':
-        search_term = request.args.get('search')
-        area_term = request.args.get('area')
-        unit_term = request.args.get('unit')
-        keyword_term = request.args.get('keyword')
-        modules_query = Module.query
-        if not modules_query.all():
-            return render_template("modules.html")
-        if area_term and area_term != '':
-            modules_query = modules_query.filter(Module.units.any(Unit.area.has(Area.name == area_term)))
-        if unit_term and unit_term != '':
-            modules_query = modules_query.filter(Module.units.any(Unit.name == unit_term))
-        if keyword_term and keyword_term != '':
-            modules_query = modules_query.filter(Module.keywords.any(Keyword.name == keyword_term))
-        if search_term and search_term != '':
-            modules_query = Module.query.filter(or_(
-                Module.name.ilike(f'%{search_term}%'),
-                Module.units.any(or_(
-                    Unit.name.ilike(f'%{search_term}%'),
-                    Unit.area.has(Area.name.ilike(f'%{search_term}%'))
-                )),
-                Module.keywords.any(or_(
-                    Keyword.name.ilike(f'%{search_term}%'),
-                    Keyword.acronym.ilike(f'%{search_term}%')
-                )),
-                Module.author.ilike(f'%{search_term}%')
-            ))
-        return render_template("admin/modules.html", modules=modules_query.order_by(Module.date_added.desc()).all(),
-                               search=search_term)
+        return render_module_listing("admin/modules.html")
 
 
 @app.route('/admin/edit_module/<module_id>', methods=['GET', 'POST'])
 @login_required
 def edit_module(module_id):
+    module_to_edit = Module.query.options(selectinload(Module.units), selectinload(Module.keywords),
+                                          selectinload(Module.links), selectinload(Module.files)) \
+        .filter(Module.id == module_id).first()
+    if not module_to_edit:
+        abort(404)
     if request.method == 'GET':
-        module_to_edit = Module.query.filter(Module.id == module_id).first()
-        keywords = Keyword.query.all()
-        areas = Area.query.all()
-        return render_template('admin/edit_module.html', keywords=keywords, areas=areas, module=module_to_edit)
+        vocabulary = get_vocabulary_snapshot()
+        return render_template('admin/edit_module.html', keywords=vocabulary.keywords, areas=vocabulary.areas,
+                               module=module_to_edit,
+                               selected_keyword_ids={keyword.id for keyword in module_to_edit.keywords},
+                               selected_unit_ids={unit.id for unit in module_to_edit.units})
     elif request.method == 'POST':
         params = request.get_json()
-        files = File.query.filter(File.id.in_(params["file_ids"])).all()
-        print(files)
-        keywords = Keyword.query.filter(Keyword.id.in_(params["keyword_ids"])).all()
-        print(keywords)
-        units = Unit.query.filter(Unit.id.in_(params["unit_ids"])).all()
-        print(units)
-        links = []
-        for url in params["links"].split():
-            link = Link.query.filter(Link.url == url).first()
-            if not link:
-                link = Link(url=url)
-                db.session.add(link)
-            links.append(link)
-        db.session.commit()
-        print(links)
-        new_module = Module(name=params["name"], author=params["author"], description=params["description"],
-                            notes=params["notes"], units=units, files=files, keywords=keywords, links=links)
         try:
-            db.session.add(new_module)
+            module_to_edit.date_updated = date.today()
+            save_module(module_to_edit, params)
             db.session.commit()
         except sqlalchemy.exc.IntegrityError as err:
             db.session.rollback()
-            for file in files:
-                db.session.delete(file)
-                db.session.commit()
+            discard_unclaimed_files(params["file_ids"])
             return {"code": 500, "data": "", "msg": err.orig.args}
+        invalidate_pages()
+        invalidate_facets()
+        get_archive_cache().invalidate(module_to_edit.id)
+        job_runner.enqueue('archive', {"module_id": module_to_edit.id}, key=f"module:{module_to_edit.id}")
         return {"code": 200, "data": "", "msg": "OK"}
 
 
-def load_areas():
-    with open(".data/database/area_units_edited.json", "r") as file:
-        areas = json.load(file)
-    for area in areas:
-        units = [Unit(name=unit) for unit in areas[area]]
-        new_area = Area(name=area, units=units)
-        db.session.add(new_area)
-    db.session.commit()
-
-
-def load_keywords():
-    with open(".data/database/keywords_edited.json", "r") as file:
-        keywords = json.load(file)
-    sources = []
-    for keyword in keywords:
-        for source in keywords[keyword]["sources"]:
-            new_source = Source(name=source)
-            if source not in sources:
-                sources.append(source)
-                db.session.add(new_source)
-        sources_list = [Source.query.filter(Source.name == source).first() for source in keywords[keyword]["sources"]]
-        new_keyword = Keyword(name=keyword, acronym=keywords[keyword]["acronym"], sources=sources_list)
-        db.session.add(new_keyword)
+def load_vocabulary(area_units_path=AREA_UNITS_PATH, keywords_path=KEYWORDS_PATH, prune=False, dry_run=False):
+    diff = VocabularyDiff()
+    connection = db.session.connection()
+    sync_areas(connection, Area.__table__, Unit.__table__, read_area_units(area_units_path), diff, prune,
+               unit_references=[module_units.c.unit_id])
+    sync_keywords(connection, Keyword.__table__, Source.__table__, keyword_sources, read_keywords(keywords_path),
+                  diff, prune, keyword_references=[module_keywords.c.keyword_id])
+    if dry_run:
+        db.session.rollback()
+        return diff
+    if diff.removed:
+        get_search_index().rebuild(db.session, iter_module_documents())
+        rebuild_module_summaries()
+    elif diff.updated_unit_ids or diff.updated_keyword_ids:
+        affected = db.session.query(module_units.c.module_id) \
+            .filter(module_units.c.unit_id.in_(diff.updated_unit_ids)) \
+            .union(db.session.query(module_keywords.c.module_id)
+                   .filter(module_keywords.c.keyword_id.in_(diff.updated_keyword_ids)))
+        module_ids = [row[0] for row in affected]
+        if module_ids:
+            get_search_index().index(db.session, module_documents(module_ids))
+            refresh_module_summaries(module_ids)
     db.session.commit()
+    if diff.changed:
+        invalidate_pages()
+        invalidate_vocabulary()
+    return diff
 
 
 if __name__ == '__main__':
@@ -0,0 +1,105 @@
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import sass
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+DIST_DIRECTORY = 'dist'
+MANIFEST_NAME = 'manifest.json'
+SASS_DIRECTORY = os.path.join('styles', 'sass')
+CSS_DIRECTORY = os.path.join('styles', 'css')
+COMPRESSIBLE_EXTENSIONS = {'.css', '.js', '.json', '.svg', '.txt', '.html'}
+
+
+def compile_sass(static_folder):
+    sass.compile(dirname=(os.path.join(static_folder, SASS_DIRECTORY), os.path.join(static_folder, CSS_DIRECTORY)),
+                 output_style='compressed')
+
+
+def hashed_name(relative_path, content):
+    root, ext = os.path.splitext(relative_path)
+    return f"{root}.{hashlib.sha256(content).hexdigest()[:12]}{ext}"
+
+
+def iter_static_files(static_folder):
+    skipped = {DIST_DIRECTORY, f"{DIST_DIRECTORY}.new", f"{DIST_DIRECTORY}.old", SASS_DIRECTORY}
+    for directory, subdirectories, filenames in os.walk(static_folder):
+        relative_directory = os.path.relpath(directory, static_folder)
+        subdirectories[:] = sorted(subdirectory for subdirectory in subdirectories
+                                   if os.path.normpath(os.path.join(relative_directory, subdirectory)) not in skipped)
+        for filename in sorted(filenames):
+            yield os.path.normpath(os.path.join(relative_directory, filename))
+
+
+def write_compressed(path, content):
+    if os.path.splitext(path)[1] not in COMPRESSIBLE_EXTENSIONS:
+        return
+    with open(f"{path}.gz", 'wb') as file:
+        file.write(gzip.compress(content, compresslevel=9, mtime=0))
+    if brotli is not None:
+        with open(f"{path}.br", 'wb') as file:
+            file.write(brotli.compress(content))
+
+
+def build_assets(static_folder):
+    compile_sass(static_folder)
+    dist = os.path.join(static_folder, DIST_DIRECTORY)
+    staging = f"{dist}.new"
+    shutil.rmtree(staging, ignore_errors=True)
+    manifest = {}
+    for relative_path in iter_static_files(static_folder):
+        with open(os.path.join(static_folder, relative_path), 'rb') as file:
+            content = file.read()
+        target = hashed_name(relative_path, content)
+        target_path = os.path.join(staging, target)
+        os.makedirs(os.path.dirname(target_path), exist_ok=True)
+        with open(target_path, 'wb') as file:
+            file.write(content)
+        write_compressed(target_path, content)
+        manifest[relative_path.replace(os.sep, '/')] = f"{DIST_DIRECTORY}/{target.replace(os.sep, '/')}"
+    keep_previous_build(static_folder, staging, set(manifest.values()))
+    with open(os.path.join(staging, MANIFEST_NAME), 'w') as file:
+        json.dump(manifest, file, indent=2, sort_keys=True)
+    previous = f"{dist}.old"
+    shutil.rmtree(previous, ignore_errors=True)
+    if os.path.exists(dist):
+        os.replace(dist, previous)
+    os.replace(staging, dist)
+    shutil.rmtree(previous, ignore_errors=True)
+    return manifest
+
+
+def keep_previous_build(static_folder, staging, current):
+    for target in set(load_manifest(static_folder).values()) - current:
+        source = os.path.join(static_folder, *target.split('/'))
+        destination = os.path.join(staging, *target.split('/')[1:])
+        for suffix in ('', '.gz', '.br'):
+            if os.path.isfile(source + suffix):
+                os.makedirs(os.path.dirname(destination), exist_ok=True)
+                shutil.copy2(source + suffix, destination + suffix)
+
+
+def manifest_path(static_folder):
+    return os.path.join(static_folder, DIST_DIRECTORY, MANIFEST_NAME)
+
+
+def manifest_stamp(static_folder):
+    try:
+        stat = os.stat(manifest_path(static_folder))
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns
+
+
+def load_manifest(static_folder):
+    try:
+        with open(manifest_path(static_folder), 'r') as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {}
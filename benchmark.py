@@ -0,0 +1,248 @@
+import argparse
+import json
+import logging
+import math
+import random
+import statistics
+import re
+import sys
+import time
+import urllib.error
+import urllib.request
+from urllib.parse import urlencode
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+SCENARIOS = ('modules', 'modules_search', 'modules_area', 'modules_unit', 'modules_keyword', 'module', 'download',
+             'download_all', 'api_modules')
+QUERY_COUNT_PATTERN = re.compile(r'desc="(\d+) queries"')
+READ_SIZE = 64 * 1024
+MIN_P99_SAMPLES = 1000
+PERCENTILE_TOLERANCES = {'p50_ms': 0.25, 'p95_ms': 0.5, 'p99_ms': 1.0}
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def peak_rss_kb(pid=None):
+    if pid:
+        try:
+            with open(f"/proc/{pid}/status", 'r') as status:
+                for line in status:
+                    if line.startswith('VmHWM:'):
+                        return int(line.split()[1])
+        except FileNotFoundError:
+            return None
+        return None
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def query_count(server_timing):
+    match = QUERY_COUNT_PATTERN.search(server_timing or '')
+    return int(match.group(1)) if match else None
+
+
+def scenario_targets(rng, samples):
+    from app import db, Module, Area, Unit, Keyword, File
+    module_ids = [row.id for row in db.session.query(Module.id)]
+    file_ids = [row.id for row in db.session.query(File.id).filter(File.module_id.isnot(None))]
+    archive_ids = sorted({row.module_id for row in db.session.query(File.module_id).filter(File.module_id.isnot(None))})
+    words = [word for row in db.session.query(Module.name).limit(samples * 10) for word in row.name.split()
+             if len(word) > 3]
+    names = {'area': [row.name for row in db.session.query(Area.name)],
+             'unit': [row.name for row in db.session.query(Unit.name)],
+             'keyword': [row.name for row in db.session.query(Keyword.name)]}
+
+    def sample(values):
+        return rng.sample(values, min(samples, len(values))) if values else []
+
+    return {
+        'modules': ['/modules'],
+        'modules_search': [f"/modules?{urlencode({'search': word})}" for word in sample(words)],
+        'modules_area': [f"/modules?{urlencode({'area': name})}" for name in sample(names['area'])],
+        'modules_unit': [f"/modules?{urlencode({'unit': name})}" for name in sample(names['unit'])],
+        'modules_keyword': [f"/modules?{urlencode({'keyword': name})}" for name in sample(names['keyword'])],
+        'module': [f"/module/{module_id}" for module_id in sample(module_ids)],
+        'download': [f"/download/{file_id}" for file_id in sample(file_ids)],
+        'download_all': [f"/download_all/{module_id}" for module_id in sample(archive_ids)],
+        'api_modules': ['/api/v1/modules'] + [f"/api/v1/modules?{urlencode({'keyword': name})}"
+                                              for name in sample(names['keyword'])],
+    }
+
+
+class TestClientTransport:
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def get(self, url):
+        response = self.client.get(url, buffered=False)
+        size = sum(len(chunk) for chunk in response.response)
+        response.close()
+        return response.status_code, response.headers.get('Server-Timing'), size
+
+
+class HttpTransport:
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+
+    def get(self, url):
+        try:
+            response = urllib.request.urlopen(self.base_url + url)
+        except urllib.error.HTTPError as err:
+            response = err
+        with response:
+            size = 0
+            chunk = response.read(READ_SIZE)
+            while chunk:
+                size += len(chunk)
+                chunk = response.read(READ_SIZE)
+            return response.status, ', '.join(response.headers.get_all('Server-Timing') or []), size
+
+
+def run_scenario(transport, targets, requests, warmup, rng):
+    for url in targets[:warmup]:
+        transport.get(url)
+    latencies, queries, errors, transferred = [], [], 0, 0
+    for _ in range(requests):
+        url = rng.choice(targets)
+        started = time.perf_counter()
+        status, server_timing, size = transport.get(url)
+        latencies.append((time.perf_counter() - started) * 1000)
+        transferred += size
+        if status >= 400:
+            errors += 1
+        count = query_count(server_timing)
+        if count is not None:
+            queries.append(count)
+    return {"requests": requests, "errors": errors,
+            "p50_ms": round(percentile(latencies, 0.50), 3),
+            "p95_ms": round(percentile(latencies, 0.95), 3),
+            "p99_ms": round(percentile(latencies, 0.99), 3),
+            "mean_queries": round(sum(queries) / len(queries), 2) if queries else None,
+            "max_queries": max(queries) if queries else None,
+            "bytes": transferred}
+
+
+def median_run(runs):
+    combined = dict(runs[0])
+    for metric in ('p50_ms', 'p95_ms', 'p99_ms'):
+        combined[metric] = round(statistics.median(run[metric] for run in runs), 3)
+    counts = [run["max_queries"] for run in runs if run["max_queries"] is not None]
+    combined["max_queries"] = max(counts) if counts else None
+    combined["errors"] = max(run["errors"] for run in runs)
+    combined["bytes"] = sum(run["bytes"] for run in runs)
+    combined["runs"] = len(runs)
+    return combined
+
+
+def gated_metrics(result, min_p99_samples):
+    if result["requests"] * result.get("runs", 1) >= min_p99_samples:
+        return ('p50_ms', 'p95_ms', 'p99_ms')
+    return ('p50_ms', 'p95_ms')
+
+
+def regressions(results, baseline, tolerance, min_delta_ms, min_p99_samples=MIN_P99_SAMPLES, tolerances=None):
+    tolerances = dict(PERCENTILE_TOLERANCES, **(tolerances or {}))
+    found = []
+    for name, result in results["scenarios"].items():
+        expected = baseline.get("scenarios", {}).get(name)
+        if not expected:
+            continue
+        for metric in gated_metrics(result, min_p99_samples):
+            if result[metric] > expected[metric] * (1 + tolerances[metric]) and \
+                    result[metric] - expected[metric] > min_delta_ms:
+                found.append(f"{name} {metric}: {result[metric]} > {expected[metric]}")
+        if result["max_queries"] is not None and expected.get("max_queries") is not None and \
+                result["max_queries"] > expected["max_queries"]:
+            found.append(f"{name} max_queries: {result['max_queries']} > {expected['max_queries']}")
+        if result["errors"] > expected.get("errors", 0):
+            found.append(f"{name} errors: {result['errors']} > {expected.get('errors', 0)}")
+    if results.get("peak_rss_kb") and baseline.get("peak_rss_kb") and \
+            results["peak_rss_kb"] > baseline["peak_rss_kb"] * (1 + tolerance):
+        found.append(f"peak_rss_kb: {results['peak_rss_kb']} > {baseline['peak_rss_kb']}")
+    return found
+
+
+def print_results(results):
+    print(f"{'scenario':<18}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'queries':>9}{'max q':>7}{'errors':>8}")
+    for name, result in results["scenarios"].items():
+        print(f"{name:<18}{result['p50_ms']:>10}{result['p95_ms']:>10}{result['p99_ms']:>10}"
+              f"{str(result['mean_queries']):>9}{str(result['max_queries']):>7}{result['errors']:>8}")
+    print(f"Peak RSS: {results['peak_rss_kb']} KiB")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the public pages and downloads")
+    parser.add_argument('--url', help="Benchmark a running server (e.g. http://127.0.0.1:5000) "
+                                      "instead of the Flask test client")
+    parser.add_argument('--pid', type=int, help="Server process id to read peak RSS from when using --url")
+    parser.add_argument('--requests', type=int, default=100, help="Requests per scenario")
+    parser.add_argument('--repeat', type=int, default=3,
+                        help="Runs per scenario, the median of each percentile is reported")
+    parser.add_argument('--warmup', type=int, default=5, help="Unmeasured requests per scenario")
+    parser.add_argument('--samples', type=int, default=50, help="Distinct ids/terms per scenario")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--scenario', action='append', choices=SCENARIOS, dest='scenarios')
+    parser.add_argument('--cache', action='store_true', help="Keep the page cache enabled (test client only)")
+    parser.add_argument('--output', help="Write the results to this JSON file")
+    parser.add_argument('--baseline', help="Fail if the results regress against this JSON file")
+    parser.add_argument('--save-baseline', action='store_true', help="Write the results to --baseline")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="Allowed relative peak RSS increase")
+    for metric, default in PERCENTILE_TOLERANCES.items():
+        name = metric.split('_')[0]
+        parser.add_argument(f'--tolerance-{name}', dest=f'tolerance_{name}', type=float, default=default,
+                            help=f"Allowed relative {name} latency increase (default {default})")
+    parser.add_argument('--min-delta-ms', type=float, default=2.0,
+                        help="Ignore latency increases smaller than this many milliseconds")
+    parser.add_argument('--min-p99-samples', type=int, default=MIN_P99_SAMPLES,
+                        help="Only check p99 when the runs of a scenario add up to at least this many requests")
+    args = parser.parse_args(argv)
+
+    from app import app
+    logging.getLogger('i2cl.performance').setLevel(logging.WARNING)
+    if not args.url and not args.cache:
+        app.config["CACHE_BACKEND"] = 'null'
+    rng = random.Random(args.seed)
+    with app.app_context():
+        targets = scenario_targets(rng, args.samples)
+    transport = HttpTransport(args.url) if args.url else TestClientTransport(app)
+    results = {"scenarios": {}}
+    for name in args.scenarios or SCENARIOS:
+        if targets[name]:
+            results["scenarios"][name] = median_run([run_scenario(transport, targets[name], args.requests,
+                                                                  args.warmup, rng)
+                                                     for _ in range(max(1, args.repeat))])
+    results["peak_rss_kb"] = peak_rss_kb(args.pid if args.url else None)
+    print_results(results)
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+    if args.baseline and args.save_baseline:
+        with open(args.baseline, 'w') as file:
+            json.dump(results, file, indent=2)
+        print(f"Saved baseline to {args.baseline}")
+    elif args.baseline:
+        with open(args.baseline, 'r') as file:
+            tolerances = {metric: getattr(args, f"tolerance_{metric.split('_')[0]}") for metric in PERCENTILE_TOLERANCES}
+            found = regressions(results, json.load(file), args.tolerance, args.min_delta_ms, args.min_p99_samples,
+                                tolerances)
+        for regression in found:
+            print(f"REGRESSION {regression}")
+        if found:
+            return 1
+        print("No regressions against the baseline")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -2,4 +2,5 @@
 
 set FLASK_APP app.py
 set FLASK_ENV development
+python -m flask assets build
 python -m flask run
@@ -0,0 +1,237 @@
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+
+class NullCache:
+    def get(self, key):
+        return None
+
+    def get_many(self, keys):
+        return [None for _ in keys]
+
+    def set(self, key, value, timeout=None):
+        pass
+
+    def clear(self):
+        pass
+
+    def prune(self, before):
+        pass
+
+
+class MemoryCache(NullCache):
+    def __init__(self, max_entries=2048, default_timeout=300):
+        self.max_entries = max_entries
+        self.default_timeout = default_timeout
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires and expires < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def get_many(self, keys):
+        return [self.get(key) for key in keys]
+
+    def set(self, key, value, timeout=None):
+        timeout = self.default_timeout if timeout is None else timeout
+        with self.lock:
+            self.entries[key] = (time.monotonic() + timeout if timeout else 0, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class FileSystemCache(NullCache):
+    def __init__(self, directory, default_timeout=300):
+        self.directory = directory
+        self.default_timeout = default_timeout
+        self.pruned_at = None
+
+    def path_for(self, key):
+        return os.path.join(self.directory, hashlib.sha256(key.encode()).hexdigest())
+
+    def get(self, key):
+        try:
+            with open(self.path_for(key), 'rb') as file:
+                expires, value = pickle.load(file)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return None
+        if expires and expires < time.time():
+            return None
+        return value
+
+    def get_many(self, keys):
+        return [self.get(key) for key in keys]
+
+    def set(self, key, value, timeout=None):
+        timeout = self.default_timeout if timeout is None else timeout
+        os.makedirs(self.directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.part')
+        with os.fdopen(fd, 'wb') as file:
+            pickle.dump((time.time() + timeout if timeout else 0, value), file, pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, self.path_for(key))
+
+    def clear(self):
+        if not os.path.isdir(self.directory):
+            return
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    os.remove(entry.path)
+
+    def prune(self, before):
+        if self.pruned_at and before - self.pruned_at < (self.default_timeout or 300):
+            return
+        self.pruned_at = before
+        if not os.path.isdir(self.directory):
+            return
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_file() and entry.stat().st_mtime < before:
+                        os.remove(entry.path)
+                except FileNotFoundError:
+                    continue
+
+
+class RedisCache(NullCache):
+    def __init__(self, client, default_timeout=300, prefix='i2cl:'):
+        self.client = client
+        self.default_timeout = default_timeout
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return None if value is None else pickle.loads(value)
+
+    def get_many(self, keys):
+        if not keys:
+            return []
+        return [None if value is None else pickle.loads(value)
+                for value in self.client.mget([self.prefix + key for key in keys])]
+
+    def set(self, key, value, timeout=None):
+        timeout = self.default_timeout if timeout is None else timeout
+        self.client.set(self.prefix + key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), ex=timeout or None)
+
+    def clear(self):
+        for key in self.client.scan_iter(f"{self.prefix}*"):
+            self.client.delete(key)
+
+
+class FileGeneration:
+    def __init__(self, path):
+        self.path = path
+        self.stamp = None
+        self.token = None
+
+    def current(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            self.bump()
+            stat = os.stat(self.path)
+        stamp = (stat.st_ino, stat.st_mtime_ns)
+        if stamp != self.stamp:
+            with open(self.path, 'r') as file:
+                self.token = file.read().strip()
+            self.stamp = stamp
+        return self.token
+
+    def bump(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(self.path) or '.', suffix='.part')
+        with os.fdopen(fd, 'w') as file:
+            file.write(uuid.uuid4().hex)
+        os.replace(temp_path, self.path)
+
+
+class BackendGeneration:
+    def __init__(self, backend, key='generation'):
+        self.backend = backend
+        self.key = key
+
+    def current(self):
+        token = self.backend.get(self.key)
+        if token is None:
+            token = self.bump()
+        return token
+
+    def bump(self):
+        token = uuid.uuid4().hex
+        self.backend.set(self.key, token, timeout=0)
+        return token
+
+
+class ResponseCache:
+    def __init__(self, backend, generation, timeout=None):
+        self.backend = backend
+        self.generation = generation
+        self.timeout = timeout
+
+    def key(self, *parts):
+        return ':'.join([self.generation.current()] + [str(part) for part in parts])
+
+    def get(self, key):
+        return self.backend.get(key)
+
+    def get_many(self, keys):
+        return self.backend.get_many(keys)
+
+    def set(self, key, value):
+        self.backend.set(key, value, self.timeout)
+
+    def invalidate(self):
+        before = time.time()
+        self.generation.bump()
+        self.backend.prune(before)
+
+
+def create_response_cache(config, instance_path):
+    backend_name = config.get("CACHE_BACKEND", 'memory')
+    timeout = config.get("CACHE_DEFAULT_TIMEOUT", 300)
+    generation = FileGeneration(config.get("CACHE_GENERATION_PATH", os.path.join(instance_path, 'cache_generation')))
+    if backend_name == 'memory':
+        backend = MemoryCache(config.get("CACHE_MAX_ENTRIES", 2048), timeout)
+    elif backend_name == 'filesystem':
+        backend = FileSystemCache(config.get("CACHE_DIR", os.path.join(instance_path, 'cache')), timeout)
+    elif backend_name == 'redis':
+        if redis is None:
+            raise RuntimeError("CACHE_BACKEND is 'redis' but the redis package is not installed")
+        backend = RedisCache(redis.Redis.from_url(config["CACHE_REDIS_URL"]), timeout)
+        generation = BackendGeneration(backend)
+    elif not backend_name or backend_name == 'null':
+        backend = NullCache()
+    else:
+        raise ValueError(f"Unknown cache backend {backend_name!r}")
+    return ResponseCache(backend, generation, timeout)
+
+
+def create_generation(response_cache, path, key):
+    if isinstance(response_cache.generation, BackendGeneration):
+        return BackendGeneration(response_cache.backend, key)
+    return FileGeneration(path)
@@ -1,25 +1,13 @@
 import json
-import re
-from csv import reader
+from vocabulary import KEYWORDS_PATH, read_keywords_csv
 
 
 def keywords_to_json():
-    search = re.compile(r"\([A-z0-9]+\)")
     data = {}
-    with open(".data/database/keywords_edited.csv", "r") as file:
-        csv_reader = reader(file)
-        for row in csv_reader:
-            keyword = row[0]
-            acronym = search.search(keyword)
-            if acronym:
-                keyword = keyword[:(acronym.start() - 1)]
-                dat = {"acronym": acronym.group()[1:-1]}
-            else:
-                dat = {"acronym": ""}
-            dat["sources"] = [source for source in row[1:] if source != ""]
-            if keyword in data:
-                print("Duplicate Keyword ", keyword)
-            data[keyword] = dat
+    for keyword, acronym, sources in read_keywords_csv(KEYWORDS_PATH):
+        if keyword in data:
+            print("Duplicate Keyword ", keyword)
+        data[keyword] = {"acronym": acronym, "sources": sources}
     with open(".data/database/keywords_edited.json", "w") as file:
         json.dump(data, file)
 
@@ -0,0 +1,251 @@
+import glob
+import hashlib
+import json
+import mimetypes
+import os
+import tempfile
+import uuid
+from datetime import datetime, timezone
+import unicodedata
+from urllib.parse import quote
+from flask import Response
+from storage import FILE_MODE
+from werkzeug.http import is_resource_modified
+from zipfile import ZipFile, ZipInfo, ZIP_DEFLATED, ZIP_STORED
+
+CHUNK_SIZE = 64 * 1024
+MAX_RANGES = 32
+STORED_EXTENSIONS = {
+    '.7z', '.avi', '.bz2', '.docx', '.epub', '.gif', '.gz', '.jpeg', '.jpg', '.m4a', '.m4v', '.mkv', '.mov', '.mp3',
+    '.mp4', '.odp', '.ods', '.odt', '.pdf', '.png', '.pptx', '.rar', '.webm', '.xlsx', '.xz', '.zip'
+}
+
+
+def attachment_options(filename):
+    try:
+        filename.encode('ascii')
+    except UnicodeEncodeError:
+        simple = unicodedata.normalize('NFKD', filename).encode('ascii', 'ignore').decode('ascii')
+        return {'filename': simple, 'filename*': f"UTF-8''{quote(filename, safe='')}"}
+    return {'filename': filename}
+
+
+def hash_file(path, chunk_size=CHUNK_SIZE):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as source:
+        for chunk in iter(lambda: source.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def read_range(source, start, stop, chunk_size=CHUNK_SIZE):
+    source.seek(start)
+    remaining = stop - start
+    while remaining > 0:
+        chunk = source.read(min(chunk_size, remaining))
+        if not chunk:
+            break
+        remaining -= len(chunk)
+        yield chunk
+
+
+def satisfiable_ranges(requested, length):
+    ranges = []
+    for start, stop in requested.ranges:
+        if start < 0:
+            start, stop = max(length + start, 0), length
+        else:
+            stop = length if stop is None else min(stop, length)
+        if start < stop:
+            ranges.append((start, stop))
+    return ranges
+
+
+def range_applies(request, etag, last_modified):
+    if request.range is None or request.range.units != 'bytes' or len(request.range.ranges) > MAX_RANGES:
+        return False
+    if_range = request.if_range
+    if if_range.etag is not None:
+        return if_range.etag == etag
+    if if_range.date is not None:
+        return last_modified <= if_range.date
+    return True
+
+
+def multipart_separators(ranges, length, mimetype, boundary):
+    headers = [(f"\r\n--{boundary}\r\nContent-Type: {mimetype}\r\n"
+                f"Content-Range: bytes {start}-{stop - 1}/{length}\r\n\r\n").encode() for start, stop in ranges]
+    return headers, f"\r\n--{boundary}--\r\n".encode()
+
+
+def multipart_ranges(source, ranges, headers, closing, chunk_size=CHUNK_SIZE):
+    for (start, stop), header in zip(ranges, headers):
+        yield header
+        yield from read_range(source, start, stop, chunk_size)
+    yield closing
+
+
+def ranged_file_response(request, path, etag, download_name, mimetype=None, chunk_size=CHUNK_SIZE):
+    mimetype = mimetype or mimetypes.guess_type(download_name)[0] or 'application/octet-stream'
+    source = open(path, 'rb')
+    stat = os.fstat(source.fileno())
+    length = stat.st_size
+    last_modified = datetime.fromtimestamp(int(stat.st_mtime), timezone.utc)
+    response = Response(mimetype=mimetype)
+    response.call_on_close(source.close)
+    response.headers.set('Content-Disposition', 'attachment', **attachment_options(download_name))
+    response.headers['Accept-Ranges'] = 'bytes'
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        source.close()
+        response.status_code = 304
+        return response
+    if not range_applies(request, etag, last_modified):
+        response.response = read_range(source, 0, length, chunk_size)
+        response.content_length = length
+        return response
+    ranges = satisfiable_ranges(request.range, length)
+    if not ranges:
+        source.close()
+        response.status_code = 416
+        response.headers['Content-Range'] = f"bytes */{length}"
+        return response
+    response.status_code = 206
+    if len(ranges) == 1:
+        start, stop = ranges[0]
+        response.response = read_range(source, start, stop, chunk_size)
+        response.content_length = stop - start
+        response.headers['Content-Range'] = f"bytes {start}-{stop - 1}/{length}"
+        return response
+    boundary = uuid.uuid4().hex
+    headers, closing = multipart_separators(ranges, length, mimetype, boundary)
+    response.response = multipart_ranges(source, ranges, headers, closing, chunk_size)
+    response.content_length = sum(map(len, headers)) + len(closing) + sum(stop - start for start, stop in ranges)
+    response.content_type = f"multipart/byteranges; boundary={boundary}"
+    return response
+
+
+def offloaded_response(backend, path, location, download_name, mimetype=None, root=None):
+    mimetype = mimetype or mimetypes.guess_type(download_name)[0] or 'application/octet-stream'
+    response = Response(mimetype=mimetype)
+    response.headers.set('Content-Disposition', 'attachment', **attachment_options(download_name))
+    if backend == 'x-accel-redirect':
+        relative_path = os.path.relpath(path, root) if root else os.path.basename(path)
+        response.headers['X-Accel-Redirect'] = quote(f"{location.rstrip('/')}/{relative_path.replace(os.sep, '/')}")
+    elif backend == 'x-sendfile':
+        response.headers['X-Sendfile'] = os.path.abspath(path)
+    else:
+        raise ValueError(f"Unknown download backend {backend!r}")
+    return response
+
+
+def compress_type_for(filename):
+    return ZIP_STORED if os.path.splitext(filename)[1].lower() in STORED_EXTENSIONS else ZIP_DEFLATED
+
+
+class StreamBuffer:
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def write(self, data):
+        self.buffer += data
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        return data
+
+
+def stream_zip(entries, chunk_size=CHUNK_SIZE):
+    buffer = StreamBuffer()
+    with ZipFile(buffer, 'w', ZIP_DEFLATED, allowZip64=True) as zip_file:
+        for arcname, path in entries:
+            info = ZipInfo.from_file(path, arcname)
+            info.compress_type = compress_type_for(arcname)
+            with open(path, 'rb') as source, zip_file.open(info, 'w', force_zip64=True) as target:
+                for chunk in iter(lambda: source.read(chunk_size), b''):
+                    target.write(chunk)
+                    if len(buffer.buffer) >= chunk_size:
+                        yield buffer.drain()
+            if buffer.buffer:
+                yield buffer.drain()
+    yield buffer.drain()
+
+
+class ArchiveCache:
+    def __init__(self, path, max_bytes):
+        self.path = path
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def key(module_id, entries):
+        stamps = []
+        for arcname, path in entries:
+            stat = os.stat(path)
+            stamps.append([arcname, os.path.basename(path), stat.st_mtime_ns, stat.st_size])
+        payload = json.dumps([module_id, stamps], separators=(',', ':'))
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def path_for(self, module_id, digest):
+        return os.path.join(self.path, f"{module_id}-{digest}.zip")
+
+    def get(self, module_id, digest):
+        path = self.path_for(module_id, digest)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def stream_and_store(self, module_id, digest, entries, chunk_size=CHUNK_SIZE):
+        os.makedirs(self.path, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=self.path, suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as temp_file:
+                for chunk in stream_zip(entries, chunk_size):
+                    temp_file.write(chunk)
+                    yield chunk
+            os.chmod(temp_path, FILE_MODE)
+            os.replace(temp_path, self.path_for(module_id, digest))
+            self.invalidate(module_id, keep=digest)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        self.evict()
+
+    def build(self, module_id, digest, entries, chunk_size=CHUNK_SIZE):
+        for _ in self.stream_and_store(module_id, digest, entries, chunk_size):
+            pass
+        return self.path_for(module_id, digest)
+
+    def invalidate(self, module_id, keep=None):
+        for path in glob.glob(os.path.join(glob.escape(self.path), f"{glob.escape(str(module_id))}-*.zip")):
+            if keep and path == self.path_for(module_id, keep):
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def evict(self):
+        archives = []
+        total = 0
+        with os.scandir(self.path) as entries:
+            for entry in entries:
+                if entry.name.endswith('.zip') and entry.is_file():
+                    stat = entry.stat()
+                    archives.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+        for _, size, path in sorted(archives):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
@@ -0,0 +1,28 @@
+from sqlalchemy import text
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ClauseElement, Executable
+
+
+class Explain(Executable, ClauseElement):
+    inherit_cache = False
+
+    def __init__(self, statement):
+        self.statement = statement
+
+
+@compiles(Explain)
+def compile_explain(element, compiler, **kwargs):
+    prefix = 'EXPLAIN QUERY PLAN ' if compiler.dialect.name == 'sqlite' else 'EXPLAIN '
+    return prefix + compiler.process(element.statement, **kwargs)
+
+
+def query_plan(session, statement):
+    if session.connection().dialect.name == 'postgresql':
+        session.execute(text('SET LOCAL enable_seqscan = off'))
+    return [' '.join(str(value) for value in row) for row in session.execute(Explain(statement))]
+
+
+def check_plan(session, statement, expected_indexes):
+    plan = query_plan(session, statement)
+    used = [index for index in expected_indexes if any(index in line for line in plan)]
+    return bool(used), plan
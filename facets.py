@@ -0,0 +1,83 @@
+FACETS = ('area', 'unit', 'keyword')
+
+
+def bitmap_from_ids(ids):
+    ids = list(ids)
+    if not ids:
+        return 0
+    bits = bytearray(max(ids) // 8 + 1)
+    for value in ids:
+        bits[value >> 3] |= 1 << (value & 7)
+    return int.from_bytes(bits, 'little')
+
+
+def popcount(bitmap):
+    return bitmap.bit_count() if hasattr(bitmap, 'bit_count') else bin(bitmap).count('1')
+
+
+class FacetIndex:
+    def __init__(self, module_ids, areas, units, keywords, module_units, module_keywords, change_id=0):
+        self.change_id = change_id
+        self.all_modules = bitmap_from_ids(module_ids)
+        self.names = {'area': dict(areas), 'unit': {unit_id: name for unit_id, (name, _) in units.items()},
+                      'keyword': dict(keywords)}
+        self.unit_areas = {unit_id: area_id for unit_id, (_, area_id) in units.items()}
+        self.ids = {facet: {name: value_id for value_id, name in names.items()} for facet, names in self.names.items()}
+        members = {facet: {value_id: [] for value_id in names} for facet, names in self.names.items()}
+        for facet, rows in (('unit', module_units), ('keyword', module_keywords)):
+            for module_id, value_id in rows:
+                if value_id in members[facet]:
+                    members[facet][value_id].append(module_id)
+        for unit_id, area_id in self.unit_areas.items():
+            if area_id in members['area']:
+                members['area'][area_id].extend(members['unit'][unit_id])
+        self.bitmaps = {facet: {value_id: bitmap_from_ids(module_ids) for value_id, module_ids in values.items()}
+                        for facet, values in members.items()}
+
+    def update_module(self, module_id, unit_ids=(), keyword_ids=(), exists=True):
+        bit = 1 << module_id
+        self.all_modules = self.all_modules | bit if exists else self.all_modules & ~bit
+        area_ids = {self.unit_areas.get(unit_id) for unit_id in unit_ids}
+        for facet, value_ids in (('area', area_ids), ('unit', set(unit_ids)), ('keyword', set(keyword_ids))):
+            bitmaps = self.bitmaps[facet]
+            for value_id, bitmap in bitmaps.items():
+                if value_id in value_ids and exists:
+                    bitmaps[value_id] = bitmap | bit
+                elif bitmap & bit:
+                    bitmaps[value_id] = bitmap & ~bit
+
+    def value_ids(self, facet, names):
+        return [self.ids[facet][name] for name in names if name in self.ids[facet]]
+
+    def unit_ids_for_areas(self, names):
+        area_ids = set(self.value_ids('area', names))
+        return [unit_id for unit_id, area_id in self.unit_areas.items() if area_id in area_ids]
+
+    def facet_bitmap(self, facet, names):
+        bitmap = 0
+        for value_id in self.value_ids(facet, names):
+            bitmap |= self.bitmaps[facet][value_id]
+        return bitmap
+
+    def matching(self, selected, base=None, exclude=None):
+        bitmap = self.all_modules if base is None else base & self.all_modules
+        for facet in FACETS:
+            if facet != exclude and selected.get(facet):
+                bitmap &= self.facet_bitmap(facet, selected[facet])
+        return bitmap
+
+    def counts(self, selected, base=None, limit=None):
+        counts = {}
+        for facet in FACETS:
+            candidates = self.matching(selected, base, exclude=facet)
+            value_ids = self.bitmaps[facet].keys()
+            if facet == 'unit' and selected.get('area'):
+                area_ids = set(self.value_ids('area', selected['area']))
+                value_ids = [unit_id for unit_id in value_ids if self.unit_areas[unit_id] in area_ids]
+            values = [(self.names[facet][value_id], popcount(candidates & self.bitmaps[facet][value_id]))
+                      for value_id in value_ids]
+            values = [(name, count) for name, count in values if count or name in selected.get(facet, ())]
+            chosen = set(selected.get(facet, ()))
+            values.sort(key=lambda value: (value[0] not in chosen, -value[1], value[0].lower()))
+            counts[facet] = values[:limit] if limit and facet == 'keyword' else values
+        return counts
@@ -1,99 +1,163 @@
-from app import app, db, Area, Unit, Module, Keyword, File, Link, Source, load_areas, load_keywords
-from datetime import date, datetime
+from app import app, db, Area, Unit, Module, Keyword, File, Link, module_units, module_keywords, module_links, \
+    load_vocabulary, get_blob_store, get_search_index, iter_module_documents, invalidate_pages, \
+    invalidate_vocabulary, rebuild_module_summaries, record_facet_changes, invalidate_facets
+from datetime import date, timedelta
 from faker import Faker
-from sqlalchemy import null
-import json
+from sqlalchemy import bindparam, func
+import argparse
+import hashlib
 import os
+import time
 
 fake = Faker()
 Faker.seed(0)
+BATCH_SIZE = 5000
 
 
-def fill_with_fake(fake_auk=True):
+def insert_batches(table, rows):
+    rows = list(rows)
+    for start in range(0, len(rows), BATCH_SIZE):
+        db.session.execute(table.insert(), rows[start:start + BATCH_SIZE])
+    return len(rows)
+
+
+def unique_values(n, generate, existing=()):
+    taken = set(existing)
+    values = []
+    while len(values) < n:
+        value = generate()
+        if value in taken:
+            value = f"{value} {len(taken)}"
+        if value not in taken:
+            taken.add(value)
+            values.append(value)
+    return values
+
+
+def random_date(start, end):
+    return start + timedelta(days=fake.random.randint(0, (end - start).days))
+
+
+def fill_with_fake(fake_auk=True, modules=100, files=300, links=120):
+    started = time.perf_counter()
     if fake_auk:
         random_areas(14)
         random_keywords(400)
     else:
-        areas = Area.query.all()
-        keywords = Keyword.query.all()
-        if not len(areas):
-            load_areas()
-        if not len(keywords):
-            load_keywords()
-    random_files(300)
-    random_urls(120)
-    random_modules(100)
+        load_vocabulary()
+    random_files(files)
+    random_urls(links)
+    random_modules(modules)
+    db.session.commit()
+    count = get_search_index().rebuild(db.session, iter_module_documents())
+    rebuild_module_summaries()
+    record_facet_changes()
+    db.session.commit()
+    invalidate_pages()
+    invalidate_facets()
+    invalidate_vocabulary()
+    print(f"Generated {modules} modules, {files} files and {links} links and indexed {count} modules "
+          f"in {time.perf_counter() - started:.1f}s")
 
 
 def random_modules(n):
-    areas = Area.query.all()
-    keywords = Keyword.query.all()
-    files = set(File.query.all())
-    links = Link.query.all()
-    for i in range(n):
-        new_module = Module(name=fake.catch_phrase(), author=fake.name(), description=fake.paragraph(nb_sentences=4), date_added=fake.date_between_dates(date.fromisoformat('2018-01-01'), date.fromisoformat('2019-12-31')), date_updated=fake.date_between_dates(date.fromisoformat('2020-01-01'), date.today()) if fake.random_int(min=0, max=1) else null())
-        db.session.add(new_module)
-        db.session.commit()
-    modules = Module.query.all()
-    for module in modules:
-        chosen_area = fake.random_element(areas)
-        chosen_units = list(set([fake.random_element(chosen_area.units) for _ in range(fake.random_int(min=1, max=2))]))
-        chosen_keywords = list(set([fake.random_element(keywords) for _ in range(fake.random_int(min=2, max=4))]))
-        chosen_files = list(set([fake.random_element(files) for _ in range(fake.random_int(min=1, max=3))]))
-        chosen_links = list(set([fake.random_element(links) for _ in range(fake.random_int(min=2, max=5))]))
-        module.units = chosen_units
-        module.keywords = chosen_keywords
-        module.files = chosen_files
-        module.links = chosen_links
-        for file in chosen_files:
-            files.remove(file)
-        db.session.commit()
+    random = fake.random
+    area_units = {}
+    for unit_id, area_id in db.session.query(Unit.id, Unit.area_id).filter(Unit.area_id.isnot(None)):
+        area_units.setdefault(area_id, []).append(unit_id)
+    area_unit_lists = list(area_units.values())
+    keyword_ids = [row.id for row in db.session.query(Keyword.id)]
+    link_ids = [row.id for row in db.session.query(Link.id)]
+    file_ids = [row.id for row in db.session.query(File.id).filter(File.module_id.is_(None))]
+    names = unique_values(n, fake.catch_phrase, (row.name for row in db.session.query(Module.name)))
+    first_id = (db.session.query(func.max(Module.id)).scalar() or 0) + 1
+    insert_batches(Module.__table__, (
+        {"name": name, "author": fake.name(), "description": fake.paragraph(nb_sentences=4), "notes": "",
+         "date_added": random_date(date(2018, 1, 1), date(2019, 12, 31)),
+         "date_updated": random_date(date(2020, 1, 1), date.today()) if random.random() < 0.5 else None}
+        for name in names))
+    module_ids = [row.id for row in db.session.query(Module.id).filter(Module.id >= first_id)]
+    unit_rows, keyword_rows, link_rows = [], [], []
+    for module_id in module_ids:
+        if area_unit_lists:
+            units = random.choice(area_unit_lists)
+            unit_rows.extend({"module_id": module_id, "unit_id": unit_id}
+                             for unit_id in random.sample(units, min(len(units), random.randint(1, 2))))
+        keyword_rows.extend({"module_id": module_id, "keyword_id": keyword_id}
+                            for keyword_id in random.sample(keyword_ids, min(len(keyword_ids), random.randint(2, 4))))
+        link_rows.extend({"module_id": module_id, "link_id": link_id}
+                         for link_id in random.sample(link_ids, min(len(link_ids), random.randint(2, 5))))
+    insert_batches(module_units, unit_rows)
+    insert_batches(module_keywords, keyword_rows)
+    insert_batches(module_links, link_rows)
+    random.shuffle(file_ids)
+    file_rows = []
+    module_position = 0
+    while file_ids and module_position < len(module_ids):
+        for _ in range(random.randint(1, 3)):
+            if file_ids:
+                file_rows.append({"file_id": file_ids.pop(), "owner_id": module_ids[module_position]})
+        module_position += 1
+    for start in range(0, len(file_rows), BATCH_SIZE):
+        db.session.execute(File.__table__.update().where(File.id == bindparam('file_id'))
+                           .values(module_id=bindparam('owner_id')), file_rows[start:start + BATCH_SIZE])
+    return module_ids
 
 
 def random_areas(n):
-    for i in range(n):
-        units = [unit.name for unit in Unit.query.all()]
-        new_area = Area(name=fake.word(), units=[Unit(name=word) for word in fake.words(nb=fake.random_int(min=3, max=4)) if word not in units])
-        db.session.add(new_area)
-    db.session.commit()
-
-
-def random_files(n):
-    for i in range(n):
-        new_file = File(name=fake.file_name())
-        db.session.add(new_file)
-    db.session.commit()
-    files = File.query.all()
-    for file in files:
-        with open(os.path.join(app.config["UPLOAD_PATH"], str(file.id)), "wb") as file_out:
-            file_out.write(os.urandom(1024))
+    existing_units = {row.name for row in db.session.query(Unit.name)}
+    for name in unique_values(n, fake.word, (row.name for row in db.session.query(Area.name))):
+        words = [word for word in fake.words(nb=fake.random_int(min=3, max=4)) if word not in existing_units]
+        existing_units.update(words)
+        db.session.add(Area(name=name, units=[Unit(name=word) for word in words]))
+    db.session.flush()
+
+
+def random_files(n, max_size=64 * 1024):
+    random = fake.random
+    blob_store = get_blob_store()
+    rows = []
+    for _ in range(n):
+        size = random.randint(1024, max_size)
+        content = random.getrandbits(size * 8).to_bytes(size, 'little')
+        digest = hashlib.sha256(content).hexdigest()
+        path = blob_store.path_for(digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as file_out:
+            file_out.write(content)
+        rows.append({"name": fake.file_name(), "sha256": digest, "size": len(content),
+                     "date_added": random_date(date(2018, 1, 1), date.today())})
+    return insert_batches(File.__table__, rows)
 
 
 def random_keywords(n):
-    for i in range(n):
-        keywords = [keyword.name for keyword in Keyword.query.all()]
-        name = fake.word()
-        if name not in keywords:
-            new_keyword = Keyword(name=name, acronym=''.join(fake.random_letters(length=3)).upper() if fake.random_int(min=0, max=1) else '')
-            db.session.add(new_keyword)
-    db.session.commit()
+    insert_batches(Keyword.__table__, (
+        {"name": name, "acronym": ''.join(fake.random_letters(length=3)).upper() if fake.random_int(min=0, max=1)
+         else ''} for name in unique_values(n, fake.word, (row.name for row in db.session.query(Keyword.name)))))
 
 
 def random_urls(n):
-    for i in range(n):
-        links = [link.url for link in Link.query.all()]
-        url = fake.domain_name()
-        if url not in links:
-            new_url = Link(url=url)
-            db.session.add(new_url)
-    db.session.commit()
+    insert_batches(Link.__table__, ({"url": url} for url in unique_values(
+        n, fake.domain_name, (row.url for row in db.session.query(Link.url)))))
 
 
 def clear_database():
     db.drop_all()
     db.create_all()
+    get_search_index().create(db.session.connection())
+    db.session.commit()
 
 
 if __name__ == '__main__':
-    clear_database()
-    fill_with_fake(fake_auk=False)
+    parser = argparse.ArgumentParser(description="Fill the database with generated modules")
+    parser.add_argument('--modules', type=int, default=100)
+    parser.add_argument('--files', type=int, default=300)
+    parser.add_argument('--links', type=int, default=120)
+    parser.add_argument('--fake-vocabulary', action='store_true',
+                        help="Generate random areas and keywords instead of loading the real vocabulary")
+    parser.add_argument('--append', action='store_true', help="Keep the existing data instead of clearing it")
+    args = parser.parse_args()
+    with app.app_context():
+        if not args.append:
+            clear_database()
+        fill_with_fake(args.fake_vocabulary, args.modules, args.files, args.links)
@@ -0,0 +1,265 @@
+import hashlib
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+DIGEST_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+LEGACY_PATTERN = re.compile(r'^[0-9]+$')
+BLOB = 'blob'
+LEGACY = 'legacy'
+TEMP = 'temp'
+UNKNOWN = 'unknown'
+
+
+class DiskEntry:
+    def __init__(self, kind, key, path, size, mtime_ns):
+        self.kind = kind
+        self.key = key
+        self.path = path
+        self.size = size
+        self.mtime_ns = mtime_ns
+
+
+def disk_entry(kind, key, entry):
+    stat = entry.stat(follow_symlinks=False)
+    return DiskEntry(kind, key, entry.path, stat.st_size, stat.st_mtime_ns)
+
+
+def scan_uploads(blob_store):
+    with os.scandir(blob_store.root) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                if entry.path == blob_store.blob_root:
+                    yield from scan_blobs(blob_store.blob_root)
+                elif entry.path == blob_store.temp_root:
+                    yield from scan_files(entry.path, TEMP)
+                else:
+                    yield from scan_files(entry.path, UNKNOWN)
+            elif LEGACY_PATTERN.match(entry.name):
+                yield disk_entry(LEGACY, int(entry.name), entry)
+            else:
+                yield disk_entry(UNKNOWN, entry.name, entry)
+
+
+def scan_blobs(blob_root):
+    with os.scandir(blob_root) as prefixes:
+        for prefix in prefixes:
+            if not prefix.is_dir(follow_symlinks=False):
+                yield disk_entry(UNKNOWN, prefix.name, prefix)
+                continue
+            with os.scandir(prefix.path) as entries:
+                for entry in entries:
+                    if DIGEST_PATTERN.match(entry.name) and entry.name[:2] == prefix.name:
+                        yield disk_entry(BLOB, entry.name, entry)
+                    else:
+                        yield disk_entry(TEMP, entry.name, entry)
+
+
+def scan_files(directory, kind):
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                yield from scan_files(entry.path, kind)
+            else:
+                yield disk_entry(kind, entry.name, entry)
+
+
+def hash_path(path, chunk_size):
+    digest = hashlib.sha256()
+    try:
+        with open(path, 'rb') as source:
+            for chunk in iter(lambda: source.read(chunk_size), b''):
+                digest.update(chunk)
+    except OSError:
+        return path, None
+    return path, digest.hexdigest()
+
+
+def hash_paths(paths, chunk_size, workers=None):
+    if workers == 1 or len(paths) < 2:
+        for path in paths:
+            yield hash_path(path, chunk_size)
+        return
+    with ProcessPoolExecutor(workers) as executor:
+        yield from executor.map(hash_path, paths, [chunk_size] * len(paths), chunksize=16)
+
+
+class FsckState:
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        if path and os.path.isfile(path):
+            with open(path, 'r') as file:
+                self.entries = json.load(file).get("entries", {})
+        self.seen = {}
+
+    def relative(self, entry, root):
+        return os.path.relpath(entry.path, root)
+
+    def is_fresh(self, entry, root):
+        return self.entries.get(self.relative(entry, root)) == [entry.size, entry.mtime_ns]
+
+    def verified(self, entry, root):
+        self.seen[self.relative(entry, root)] = [entry.size, entry.mtime_ns]
+
+    def save(self):
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        partial = f"{self.path}.{os.getpid()}.part"
+        with open(partial, 'w') as file:
+            json.dump({"saved_at": int(time.time()), "entries": self.seen}, file, separators=(',', ':'))
+        os.replace(partial, self.path)
+
+
+class FsckReport:
+    def __init__(self):
+        self.scanned = 0
+        self.scanned_bytes = 0
+        self.rows = 0
+        self.hashed = 0
+        self.hashed_bytes = 0
+        self.skipped = 0
+        self.pending = []
+        self.corrupt = []
+        self.dangling = []
+        self.unattached = []
+        self.orphans = []
+        self.stale = []
+        self.unknown = []
+        self.reclaimed_files = 0
+        self.reclaimed_bytes = 0
+        self.reclaimed_rows = 0
+
+    @property
+    def problems(self):
+        return bool(self.corrupt or self.dangling)
+
+    def summary(self):
+        orphan_bytes = sum(entry.size for entry in self.orphans + self.stale)
+        return [f"Scanned {self.scanned} files ({self.scanned_bytes} bytes) and {self.rows} file rows",
+                f"Hashed {self.hashed} files ({self.hashed_bytes} bytes), {self.skipped} unchanged since the last run",
+                f"{len(self.corrupt)} corrupt, {len(self.dangling)} rows without data, "
+                f"{len(self.pending)} waiting for a checksum",
+                f"{len(self.orphans)} orphaned and {len(self.stale)} stale temporary files ({orphan_bytes} bytes), "
+                f"{len(self.unattached)} rows never attached to a module",
+                f"{len(self.unknown)} unrecognised files left alone"]
+
+    def details(self):
+        return [f"corrupt {path}" for path in self.corrupt] + \
+               [f"dangling file {file_id}" for file_id in self.dangling] + \
+               [f"unattached file {file_id}" for file_id in self.unattached] + \
+               [f"orphan {entry.path}" for entry in self.orphans] + \
+               [f"stale {entry.path}" for entry in self.stale] + \
+               [f"unknown {entry.path}" for entry in self.unknown]
+
+
+def file_rows(session, model, batch_size):
+    last_id = 0
+    while True:
+        rows = session.query(model.id, model.sha256, model.module_id, model.date_added, model.created_at) \
+            .filter(model.id > last_id).order_by(model.id).limit(batch_size).all()
+        if not rows:
+            return
+        yield from rows
+        last_id = rows[-1].id
+
+
+def uploaded_before(row, cutoff_time, cutoff_date):
+    if row.created_at is not None:
+        return row.created_at < cutoff_time
+    return row.date_added is not None and row.date_added < cutoff_date
+
+
+def check_storage(session, model, blob_store, state, batch_size=1000, workers=None, grace_seconds=86400,
+                  full=False):
+    report = FsckReport()
+    cutoff_ns = (time.time() - grace_seconds) * 1e9
+    cutoff_time = datetime.utcnow() - timedelta(seconds=grace_seconds)
+    cutoff_date = cutoff_time.date()
+    blobs, legacy = {}, {}
+    for entry in scan_uploads(blob_store):
+        report.scanned += 1
+        report.scanned_bytes += entry.size
+        if entry.kind == BLOB:
+            blobs[entry.key] = entry
+        elif entry.kind == LEGACY:
+            legacy[entry.key] = entry
+        elif entry.kind == TEMP:
+            if entry.mtime_ns < cutoff_ns:
+                report.stale.append(entry)
+        else:
+            report.unknown.append(entry)
+
+    referenced_blobs, referenced_legacy, expected = set(), set(), {}
+    for row in file_rows(session, model, batch_size):
+        report.rows += 1
+        if row.module_id is None and uploaded_before(row, cutoff_time, cutoff_date):
+            report.unattached.append(row.id)
+            continue
+        if row.sha256 and row.sha256 in blobs:
+            referenced_blobs.add(row.sha256)
+        elif row.id in legacy:
+            referenced_legacy.add(row.id)
+            if row.sha256:
+                expected[legacy[row.id].path] = row.sha256
+            else:
+                report.pending.append(row.id)
+        else:
+            report.dangling.append(row.id)
+
+    for digest in referenced_blobs:
+        expected[blobs[digest].path] = digest
+    report.orphans = [entry for key, entry in blobs.items() if key not in referenced_blobs] + \
+                     [entry for key, entry in legacy.items() if key not in referenced_legacy]
+    report.orphans = [entry for entry in report.orphans if entry.mtime_ns < cutoff_ns]
+
+    entries = {entry.path: entry for entry in list(blobs.values()) + list(legacy.values())}
+    to_hash = []
+    for path in sorted(expected):
+        if not full and state.is_fresh(entries[path], blob_store.root):
+            state.verified(entries[path], blob_store.root)
+            report.skipped += 1
+        else:
+            to_hash.append(path)
+    for path, digest in hash_paths(to_hash, blob_store.chunk_size, workers):
+        report.hashed += 1
+        report.hashed_bytes += entries[path].size
+        if digest == expected[path]:
+            state.verified(entries[path], blob_store.root)
+        else:
+            report.corrupt.append(path)
+    return report
+
+
+def reclaim_storage(session, model, blob_store, report, batch_size=1000):
+    stale_ids = report.unattached + [file_id for file_id in report.dangling
+                                     if not still_stored(session, model, blob_store, file_id)]
+    for start in range(0, len(stale_ids), batch_size):
+        report.reclaimed_rows += model.query.filter(model.id.in_(stale_ids[start:start + batch_size])) \
+            .delete(synchronize_session=False)
+    session.commit()
+
+    orphans = {(entry.kind, entry.key): entry for entry in report.orphans}
+    for kind, column in ((BLOB, model.sha256), (LEGACY, model.id)):
+        keys = [key for orphan_kind, key in orphans if orphan_kind == kind]
+        for start in range(0, len(keys), batch_size):
+            for row in session.query(column).filter(column.in_(keys[start:start + batch_size])):
+                orphans.pop((kind, row[0]), None)
+
+    for entry in list(orphans.values()) + report.stale:
+        try:
+            os.remove(entry.path)
+        except FileNotFoundError:
+            continue
+        report.reclaimed_files += 1
+        report.reclaimed_bytes += entry.size
+    return report
+
+
+def still_stored(session, model, blob_store, file_id):
+    row = session.get(model, file_id)
+    return row is None or os.path.isfile(blob_store.path_for_file(row))
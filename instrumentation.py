@@ -0,0 +1,131 @@
+import bisect
+import json
+import logging
+import threading
+import time
+from flask import g, request, has_request_context, before_render_template, template_rendered, signals_available
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250)
+
+logger = logging.getLogger('i2cl.performance')
+
+
+class Histogram:
+    def __init__(self, name, description, buckets):
+        self.name = name
+        self.description = description
+        self.buckets = buckets
+        self.series = {}
+
+    def observe(self, label, value):
+        counts, total = self.series.get(label, ([0] * (len(self.buckets) + 1), 0.0))
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.series[label] = (counts, total + value)
+
+    def exposition(self):
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        for label, (counts, total) in sorted(self.series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{endpoint="{label}",le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{endpoint="{label}"}} {total}')
+            lines.append(f'{self.name}_count{{endpoint="{label}"}} {cumulative}')
+        return lines
+
+
+class Instrumentation:
+    def __init__(self, app=None):
+        self.lock = threading.Lock()
+        self.latency = Histogram('i2cl_request_duration_seconds', 'Total request latency', LATENCY_BUCKETS)
+        self.sql_time = Histogram('i2cl_request_sql_seconds', 'Cumulative SQL time per request', LATENCY_BUCKETS)
+        self.render_time = Histogram('i2cl_request_render_seconds', 'Template render time per request',
+                                     LATENCY_BUCKETS)
+        self.queries = Histogram('i2cl_request_queries', 'SQL statements executed per request', QUERY_BUCKETS)
+        self.slow_query_threshold = 0.5
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.slow_query_threshold = app.config.get("SLOW_QUERY_THRESHOLD", 0.5)
+        if not logger.handlers:
+            handler = logging.StreamHandler()
+            handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s %(message)s'))
+            logger.addHandler(handler)
+            logger.setLevel(app.config.get("PERFORMANCE_LOG_LEVEL", logging.INFO))
+        app.extensions['instrumentation'] = self
+        app.before_request(self.start_request)
+        app.after_request(self.finish_request)
+        event.listen(Engine, 'before_cursor_execute', self.before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', self.after_cursor_execute)
+        if signals_available:
+            before_render_template.connect(self.before_render, app)
+            template_rendered.connect(self.after_render, app)
+
+    def start_request(self):
+        g.performance = {"start": time.perf_counter(), "queries": 0, "sql_time": 0.0, "slowest_sql": 0.0,
+                         "slowest_statement": None, "render_time": 0.0, "render_start": None}
+
+    def before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context.i2cl_query_start = time.perf_counter()
+
+    def after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, 'i2cl_query_start', None)
+        if started is None:
+            return
+        duration = time.perf_counter() - started
+        if duration >= self.slow_query_threshold:
+            logger.warning(json.dumps({"event": "slow_query", "duration_ms": round(duration * 1000, 2),
+                                       "statement": statement}))
+        if not has_request_context() or 'performance' not in g:
+            return
+        stats = g.performance
+        stats["queries"] += 1
+        stats["sql_time"] += duration
+        if duration > stats["slowest_sql"]:
+            stats["slowest_sql"] = duration
+            stats["slowest_statement"] = statement
+
+    def before_render(self, sender, template, context, **extra):
+        if 'performance' in g:
+            g.performance["render_start"] = time.perf_counter()
+
+    def after_render(self, sender, template, context, **extra):
+        if 'performance' in g and g.performance["render_start"] is not None:
+            g.performance["render_time"] += time.perf_counter() - g.performance["render_start"]
+            g.performance["render_start"] = None
+
+    def finish_request(self, response):
+        stats = g.pop('performance', None)
+        if stats is None:
+            return response
+        total = time.perf_counter() - stats["start"]
+        endpoint = request.endpoint or 'unmatched'
+        response.headers.add('Server-Timing',
+                             f'sql;dur={stats["sql_time"] * 1000:.2f};desc="{stats["queries"]} queries"')
+        response.headers.add('Server-Timing', f'render;dur={stats["render_time"] * 1000:.2f}')
+        response.headers.add('Server-Timing', f'total;dur={total * 1000:.2f}')
+        with self.lock:
+            self.latency.observe(endpoint, total)
+            self.sql_time.observe(endpoint, stats["sql_time"])
+            self.render_time.observe(endpoint, stats["render_time"])
+            self.queries.observe(endpoint, stats["queries"])
+        logger.info(json.dumps({"event": "request", "method": request.method, "path": request.path,
+                                "endpoint": endpoint, "status": response.status_code,
+                                "duration_ms": round(total * 1000, 2), "queries": stats["queries"],
+                                "sql_ms": round(stats["sql_time"] * 1000, 2),
+                                "slowest_sql_ms": round(stats["slowest_sql"] * 1000, 2),
+                                "slowest_statement": stats["slowest_statement"],
+                                "render_ms": round(stats["render_time"] * 1000, 2)}))
+        return response
+
+    def exposition(self):
+        with self.lock:
+            lines = []
+            for histogram in (self.latency, self.sql_time, self.render_time, self.queries):
+                lines.extend(histogram.exposition())
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,119 @@
+import json
+import logging
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+QUEUED = 'queued'
+RUNNING = 'running'
+FINISHED = 'finished'
+FAILED = 'failed'
+ACTIVE = (QUEUED, RUNNING)
+
+logger = logging.getLogger('i2cl.jobs')
+
+
+class JobRunner:
+    def __init__(self, app, db, model, max_workers=1, synchronous=False):
+        self.app = app
+        self.db = db
+        self.model = model
+        self.max_workers = max_workers
+        self.synchronous = synchronous
+        self.handlers = {}
+        self.executor = None
+        self.lock = threading.Lock()
+
+    def task(self, name):
+        def register(handler):
+            self.handlers[name] = handler
+            return handler
+        return register
+
+    def enqueue(self, name, payload=None, key=None, submit=True):
+        if name not in self.handlers:
+            raise KeyError(name)
+        session = self.db.session
+        if key is not None:
+            existing = self.model.query.filter(self.model.name == name, self.model.key == key,
+                                               self.model.status == QUEUED).first()
+            if existing:
+                return existing
+        job = self.model(name=name, key=key, status=QUEUED, payload=json.dumps(payload or {}),
+                         created_at=datetime.utcnow())
+        session.add(job)
+        session.commit()
+        if submit:
+            self.submit(job.id)
+        return job
+
+    def submit(self, job_id):
+        if self.synchronous:
+            self.run(job_id)
+            return
+        with self.lock:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix='i2cl-job')
+        self.executor.submit(self.run_in_context, job_id)
+
+    def run_in_context(self, job_id):
+        with self.app.app_context():
+            self.run(job_id)
+
+    def claim(self, job_id):
+        claimed = self.model.query.filter(self.model.id == job_id, self.model.status == QUEUED) \
+            .update({self.model.status: RUNNING, self.model.started_at: datetime.utcnow()},
+                    synchronize_session=False)
+        self.db.session.commit()
+        return claimed == 1
+
+    def run(self, job_id):
+        if not self.claim(job_id):
+            return None
+        session = self.db.session
+        job = session.get(self.model, job_id)
+        try:
+            result = self.handlers[job.name](**json.loads(job.payload or '{}'))
+            job = session.get(self.model, job_id)
+            job.status = FINISHED
+            job.result = json.dumps(result)
+        except Exception:
+            session.rollback()
+            logger.exception("Job %s (%s) failed", job_id, job.name)
+            job = session.get(self.model, job_id)
+            job.status = FAILED
+            job.error = traceback.format_exc(limit=5)
+        job.finished_at = datetime.utcnow()
+        session.commit()
+        return job
+
+    def requeue_running(self):
+        requeued = self.model.query.filter(self.model.status == RUNNING) \
+            .update({self.model.status: QUEUED, self.model.started_at: None}, synchronize_session=False)
+        self.db.session.commit()
+        return requeued
+
+    def work(self):
+        processed = 0
+        while True:
+            job = self.model.query.filter(self.model.status == QUEUED).order_by(self.model.id).first()
+            if job is None:
+                return processed
+            if self.run(job.id) is not None:
+                processed += 1
+
+    def shutdown(self, wait=True):
+        if self.executor is not None:
+            self.executor.shutdown(wait=wait)
+            self.executor = None
+
+
+def describe(job):
+    return {"id": job.id, "name": job.name, "key": job.key, "status": job.status,
+            "payload": json.loads(job.payload or '{}'),
+            "result": json.loads(job.result) if job.result else None,
+            "error": job.error,
+            "created_at": job.created_at.isoformat() if job.created_at else None,
+            "started_at": job.started_at.isoformat() if job.started_at else None,
+            "finished_at": job.finished_at.isoformat() if job.finished_at else None}
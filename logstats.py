@@ -0,0 +1,193 @@
+import gzip
+import math
+import re
+from urllib.parse import parse_qs, urlsplit
+
+from werkzeug.exceptions import HTTPException
+
+LOG_PATTERN = re.compile(r'(?P<address>\S+) \S+ (?P<user>\S+) \[(?P<time>[^\]]+)\] '
+                         r'"(?P<method>[A-Z]+) (?P<target>\S+)(?: [^"]*)?" (?P<status>\d{3}) (?P<bytes>\d+|-)'
+                         r'(?: "(?P<referer>[^"]*)" "(?P<agent>[^"]*)")?(?: (?:rt=)?(?P<seconds>[\d.]+|-))?')
+DOWNLOAD_PATTERN = re.compile(r'^/download/(\d+)$')
+ARCHIVE_PATTERN = re.compile(r'^/download_all/(\d+)$')
+SEARCH_PATHS = ('/modules', '/api/v1/modules')
+OTHER_ROUTE = 'other'
+
+
+class LogRecord:
+    def __init__(self, time, method, path, query, status, size, seconds):
+        self.time = time
+        self.method = method
+        self.path = path
+        self.query = query
+        self.status = status
+        self.size = size
+        self.seconds = seconds
+
+
+def open_log(path):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8', errors='replace')
+    return open(path, 'r', encoding='utf-8', errors='replace')
+
+
+def read_lines(paths):
+    for path in paths:
+        with open_log(path) as log:
+            yield from log
+
+
+def parse_line(line):
+    match = LOG_PATTERN.match(line)
+    if not match:
+        return None
+    target = urlsplit(match['target'])
+    seconds = match['seconds']
+    return LogRecord(match['time'], match['method'], target.path, target.query, int(match['status']),
+                     0 if match['bytes'] == '-' else int(match['bytes']),
+                     None if seconds in (None, '-') else float(seconds))
+
+
+def normalize_term(term):
+    return ' '.join(term.lower().split())
+
+
+class LatencyHistogram:
+    def __init__(self, smallest_ms=1.0, growth=1.1, buckets=128):
+        self.smallest_ms = smallest_ms
+        self.growth = growth
+        self.counts = [0] * buckets
+        self.count = 0
+        self.total_ms = 0.0
+
+    def bucket(self, milliseconds):
+        if milliseconds <= self.smallest_ms:
+            return 0
+        index = int(math.ceil(math.log(milliseconds / self.smallest_ms, self.growth)))
+        return min(index, len(self.counts) - 1)
+
+    def add(self, milliseconds):
+        self.counts[self.bucket(milliseconds)] += 1
+        self.count += 1
+        self.total_ms += milliseconds
+
+    def percentile(self, fraction):
+        if not self.count:
+            return None
+        wanted = max(1, math.ceil(fraction * self.count))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= wanted:
+                return round(self.smallest_ms * self.growth ** index, 1)
+        return None
+
+
+class TopCounter:
+    def __init__(self, capacity=1000):
+        self.capacity = capacity
+        self.counts = {}
+
+    def add(self, key, size=0):
+        entry = self.counts.get(key)
+        if entry is None:
+            if len(self.counts) >= self.capacity * 2:
+                self.prune()
+            entry = self.counts[key] = [0, 0]
+        entry[0] += 1
+        entry[1] += size
+
+    def prune(self):
+        self.counts = dict(self.most_common(self.capacity))
+
+    def most_common(self, limit):
+        return sorted(self.counts.items(), key=lambda item: item[1][0], reverse=True)[:limit]
+
+
+class RouteStats:
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.bytes = 0
+        self.latency = LatencyHistogram()
+
+    def add(self, record):
+        self.requests += 1
+        self.bytes += record.size
+        if record.status >= 500:
+            self.errors += 1
+        if record.seconds is not None:
+            self.latency.add(record.seconds * 1000)
+
+    def as_dict(self):
+        return {"requests": self.requests, "errors": self.errors, "bytes": self.bytes,
+                "p50_ms": self.latency.percentile(0.50), "p95_ms": self.latency.percentile(0.95),
+                "p99_ms": self.latency.percentile(0.99),
+                "mean_ms": round(self.latency.total_ms / self.latency.count, 1) if self.latency.count else None}
+
+
+class LogSummary:
+    def __init__(self, url_map, capacity=1000):
+        self.adapter = url_map.bind('localhost')
+        self.routes = {}
+        self.downloads = TopCounter(capacity)
+        self.archives = TopCounter(capacity)
+        self.searches = TopCounter(capacity)
+        self.lines = 0
+        self.malformed = 0
+        self.bytes = 0
+        self.first_time = None
+        self.last_time = None
+
+    def route_for(self, record):
+        try:
+            rule, _ = self.adapter.match(record.path, record.method, return_rule=True)
+        except HTTPException:
+            return OTHER_ROUTE
+        return rule.rule
+
+    def add(self, record):
+        self.lines += 1
+        self.bytes += record.size
+        self.first_time = self.first_time or record.time
+        self.last_time = record.time
+        route = self.route_for(record)
+        self.routes.setdefault(route, RouteStats()).add(record)
+        if record.status >= 400:
+            return
+        match = DOWNLOAD_PATTERN.match(record.path)
+        if match:
+            self.downloads.add(int(match.group(1)), record.size)
+            return
+        match = ARCHIVE_PATTERN.match(record.path)
+        if match:
+            self.archives.add(int(match.group(1)), record.size)
+            return
+        if record.path in SEARCH_PATHS and record.query:
+            for term in parse_qs(record.query).get('search', []):
+                term = normalize_term(term)
+                if term:
+                    self.searches.add(term)
+
+    def consume(self, paths):
+        for record in map(parse_line, read_lines(paths)):
+            if record is None:
+                self.malformed += 1
+            else:
+                self.add(record)
+        return self
+
+    def as_dict(self, top=20, file_names=None, module_names=None):
+        file_names = file_names or {}
+        module_names = module_names or {}
+        return {
+            "period": {"first": self.first_time, "last": self.last_time},
+            "requests": self.lines, "malformed": self.malformed, "bytes": self.bytes,
+            "routes": {route: stats.as_dict() for route, stats in
+                       sorted(self.routes.items(), key=lambda item: item[1].requests, reverse=True)},
+            "downloads": [{"file_id": file_id, "name": file_names.get(file_id), "requests": hits, "bytes": size}
+                          for file_id, (hits, size) in self.downloads.most_common(top)],
+            "archives": [{"module_id": module_id, "name": module_names.get(module_id), "requests": hits,
+                          "bytes": size} for module_id, (hits, size) in self.archives.most_common(top)],
+            "searches": [{"term": term, "requests": hits} for term, (hits, _) in self.searches.most_common(top)],
+        }
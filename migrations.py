@@ -0,0 +1,129 @@
+from datetime import datetime
+from sqlalchemy import BigInteger, Column, Date, DateTime, ForeignKey, Index, Integer, MetaData, String, Table, Text, \
+    inspect, select
+
+migrations_table = Table('schema_migrations', MetaData(),
+                         Column('version', String(64), primary_key=True),
+                         Column('description', String(200)),
+                         Column('applied_at', DateTime()))
+MIGRATIONS = []
+
+
+class Migration:
+    def __init__(self, version, description, apply):
+        self.version = version
+        self.description = description
+        self.apply = apply
+
+
+def migration(version, description):
+    def register(apply):
+        MIGRATIONS.append(Migration(version, description, apply))
+        return apply
+    return register
+
+
+def add_column(connection, table_name, column):
+    if column.name in {existing["name"] for existing in inspect(connection).get_columns(table_name)}:
+        return False
+    column_type = column.type.compile(dialect=connection.dialect)
+    default = f" DEFAULT {column.server_default.arg}" if column.server_default is not None else ''
+    connection.exec_driver_sql(f"ALTER TABLE {table_name} ADD COLUMN {column.name} {column_type}{default}")
+    return True
+
+
+def create_index(connection, name, table_name, *column_names):
+    if name in {existing["name"] for existing in inspect(connection).get_indexes(table_name)}:
+        return False
+    table = Table(table_name, MetaData(), autoload_with=connection)
+    Index(name, *[table.c[column_name] for column_name in column_names]).create(connection)
+    return True
+
+
+def applied_versions(connection):
+    migrations_table.create(connection, checkfirst=True)
+    return {row.version for row in connection.execute(select(migrations_table.c.version))}
+
+
+def pending_migrations(connection):
+    applied = applied_versions(connection)
+    return [pending for pending in MIGRATIONS if pending.version not in applied]
+
+
+def upgrade(connection):
+    applied = []
+    for pending in pending_migrations(connection):
+        pending.apply(connection)
+        connection.execute(migrations_table.insert().values(version=pending.version,
+                                                            description=pending.description,
+                                                            applied_at=datetime.utcnow()))
+        applied.append(pending)
+    return applied
+
+
+@migration('0001', "Add sha256 and size columns to files")
+def file_checksums(connection):
+    add_column(connection, 'files', Column('sha256', String(64)))
+    add_column(connection, 'files', Column('size', BigInteger()))
+
+
+@migration('0002', "Index listing order, foreign keys and reverse association lookups")
+def listing_indexes(connection):
+    create_index(connection, 'ix_modules_date_added_id', 'modules', 'date_added', 'id')
+    create_index(connection, 'ix_modules_author', 'modules', 'author')
+    create_index(connection, 'ix_units_area_id', 'units', 'area_id')
+    create_index(connection, 'ix_files_module_id', 'files', 'module_id')
+    create_index(connection, 'ix_files_sha256', 'files', 'sha256')
+    create_index(connection, 'ix_module_units_unit_id_module_id', 'module_units', 'unit_id', 'module_id')
+    create_index(connection, 'ix_module_keywords_keyword_id_module_id', 'module_keywords', 'keyword_id', 'module_id')
+    create_index(connection, 'ix_module_links_link_id_module_id', 'module_links', 'link_id', 'module_id')
+    create_index(connection, 'ix_keyword_sources_source_id_keyword_id', 'keyword_sources', 'source_id', 'keyword_id')
+
+
+@migration('0003', "Add the module_summary read model")
+def module_summary(connection):
+    metadata = MetaData()
+    Table('modules', metadata, autoload_with=connection)
+    Table('module_summary', metadata,
+          Column('module_id', Integer(), ForeignKey('modules.id', ondelete='CASCADE'), primary_key=True),
+          Column('name', String(100)),
+          Column('author', String(100)),
+          Column('description', String(8192)),
+          Column('area', String(100)),
+          Column('units', Text()),
+          Column('keywords', Text()),
+          Column('effective_date', Date())).create(connection, checkfirst=True)
+
+
+@migration('0004', "Add the jobs table")
+def jobs_table(connection):
+    table = Table('jobs', MetaData(),
+                  Column('id', Integer(), primary_key=True),
+                  Column('name', String(50)),
+                  Column('key', String(200)),
+                  Column('status', String(20)),
+                  Column('payload', Text()),
+                  Column('result', Text()),
+                  Column('error', Text()),
+                  Column('created_at', DateTime()),
+                  Column('started_at', DateTime()),
+                  Column('finished_at', DateTime()))
+    table.create(connection, checkfirst=True)
+    create_index(connection, 'ix_jobs_status_name_key', 'jobs', 'status', 'name', 'key')
+
+
+@migration('0005', "Add a session version to users")
+def user_session_version(connection):
+    add_column(connection, 'users', Column('session_version', Integer(), nullable=False, server_default='0'))
+
+
+@migration('0006', "Add the facet change log")
+def facet_changes(connection):
+    Table('facet_changes', MetaData(),
+          Column('id', Integer(), primary_key=True),
+          Column('module_id', Integer())).create(connection, checkfirst=True)
+
+
+@migration('0007', "Record when file rows are created")
+def file_created_at(connection):
+    add_column(connection, 'files', Column('created_at', DateTime()))
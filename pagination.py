@@ -0,0 +1,74 @@
+import base64
+import binascii
+import json
+from datetime import date, datetime
+from sqlalchemy import and_, or_
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class KeysetPage:
+    def __init__(self, items, total, next_cursor, per_page):
+        self.items = items
+        self.total = total
+        self.next_cursor = next_cursor
+        self.per_page = per_page
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+def encode_cursor(values):
+    payload = json.dumps([value.isoformat() if isinstance(value, (date, datetime)) else value for value in values],
+                         separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, ordering):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (binascii.Error, ValueError) as err:
+        raise InvalidCursor(cursor) from err
+    if not isinstance(values, list) or len(values) != len(ordering):
+        raise InvalidCursor(cursor)
+    decoded = []
+    for value, (column, _) in zip(values, ordering):
+        python_type = column.type.python_type
+        try:
+            if value is None:
+                decoded.append(None)
+            elif python_type in (date, datetime):
+                decoded.append(python_type.fromisoformat(value))
+            else:
+                decoded.append(python_type(value))
+        except (TypeError, ValueError) as err:
+            raise InvalidCursor(cursor) from err
+    return decoded
+
+
+def keyset_filter(ordering, values):
+    clauses = []
+    for position, (column, descending) in enumerate(ordering):
+        equal = [previous == value for (previous, _), value in zip(ordering[:position], values[:position])]
+        clauses.append(and_(*equal, column < values[position] if descending else column > values[position]))
+    return or_(*clauses)
+
+
+def order_clauses(ordering):
+    return [column.desc() if descending else column.asc() for column, descending in ordering]
+
+
+def keyset_query(query, ordering, cursor=None, per_page=25):
+    page_query = query.add_columns(*[column for column, _ in ordering])
+    if cursor:
+        page_query = page_query.filter(keyset_filter(ordering, decode_cursor(cursor, ordering)))
+    return page_query.order_by(*order_clauses(ordering)).limit(per_page + 1)
+
+
+def keyset_paginate(query, ordering, cursor=None, per_page=25, total=None):
+    rows = keyset_query(query, ordering, cursor, per_page).all()
+    next_cursor = encode_cursor(rows[per_page - 1][1:]) if len(rows) > per_page else None
+    return KeysetPage([row[0] for row in rows[:per_page]], total, next_cursor, per_page)
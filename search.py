@@ -0,0 +1,218 @@
+import re
+from sqlalchemy import Table, Column, Integer, Float, String, MetaData, Index, select, func, text, and_, \
+    bindparam, inspect, union_all
+
+FIELDS = ('name', 'author', 'units', 'keywords', 'description', 'notes')
+FIELD_WEIGHTS = {'name': 10.0, 'author': 5.0, 'units': 4.0, 'keywords': 4.0, 'description': 1.0, 'notes': 1.0}
+TOKEN_PATTERN = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(value):
+    return TOKEN_PATTERN.findall((value or '').lower())
+
+
+def tokenized_phrases(term, alternatives=()):
+    phrases = []
+    for phrase in (term,) + tuple(alternatives):
+        tokens = tokenize(phrase)
+        if tokens and tokens not in phrases:
+            phrases.append(tokens)
+    return phrases
+
+
+class SearchIndex:
+    name = None
+    table_name = 'module_search'
+
+    def exists(self, bind):
+        return self.table_name in inspect(bind).get_table_names()
+
+    def create(self, bind):
+        raise NotImplementedError
+
+    def drop(self, bind):
+        raise NotImplementedError
+
+    def index(self, session, documents):
+        raise NotImplementedError
+
+    def remove(self, session, module_ids):
+        raise NotImplementedError
+
+    def ranked(self, term, alternatives=()):
+        raise NotImplementedError
+
+    def rebuild(self, session, documents, batch_size=500):
+        self.drop(session.connection())
+        self.create(session.connection())
+        batch = []
+        count = 0
+        for document in documents:
+            batch.append(document)
+            if len(batch) >= batch_size:
+                self.index(session, batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            self.index(session, batch)
+            count += len(batch)
+        return count
+
+
+class SqliteSearchIndex(SearchIndex):
+    name = 'sqlite-fts5'
+
+    def create(self, bind):
+        columns = ', '.join(FIELDS)
+        bind.execute(text(f"CREATE VIRTUAL TABLE IF NOT EXISTS module_search USING fts5({columns}, "
+                          f"tokenize='unicode61 remove_diacritics 2')"))
+
+    def drop(self, bind):
+        bind.execute(text("DROP TABLE IF EXISTS module_search"))
+
+    def index(self, session, documents):
+        documents = list(documents)
+        if not documents:
+            return
+        self.remove(session, [document['id'] for document in documents])
+        columns = ', '.join(FIELDS)
+        values = ', '.join(f':{field}' for field in FIELDS)
+        session.execute(text(f"INSERT INTO module_search (rowid, {columns}) VALUES (:id, {values})"), documents)
+
+    def remove(self, session, module_ids):
+        if module_ids:
+            session.execute(text("DELETE FROM module_search WHERE rowid IN :ids")
+                            .bindparams(bindparam('ids', expanding=True)), {"ids": list(module_ids)})
+
+    def ranked(self, term, alternatives=()):
+        phrases = tokenized_phrases(term, alternatives)
+        if not phrases:
+            return None
+        weights = ', '.join(str(FIELD_WEIGHTS[field]) for field in FIELDS)
+        query = ' OR '.join('(' + ' '.join(f'"{token}"*' for token in tokens) + ')' for tokens in phrases)
+        return text(f"SELECT rowid AS module_id, bm25(module_search, {weights}) AS rank "
+                    f"FROM module_search WHERE module_search MATCH :search_query") \
+            .bindparams(search_query=query) \
+            .columns(module_id=Integer, rank=Float) \
+            .subquery('search_rank')
+
+
+class PostgresSearchIndex(SearchIndex):
+    name = 'postgres-tsvector'
+    field_labels = {'name': 'A', 'author': 'B', 'units': 'B', 'keywords': 'B', 'description': 'C', 'notes': 'D'}
+
+    def create(self, bind):
+        bind.execute(text("CREATE TABLE IF NOT EXISTS module_search ("
+                          "module_id INTEGER PRIMARY KEY REFERENCES modules(id) ON DELETE CASCADE, "
+                          "document TSVECTOR NOT NULL)"))
+        bind.execute(text("CREATE INDEX IF NOT EXISTS ix_module_search_document "
+                          "ON module_search USING GIN (document)"))
+
+    def drop(self, bind):
+        bind.execute(text("DROP TABLE IF EXISTS module_search"))
+
+    def index(self, session, documents):
+        documents = list(documents)
+        if not documents:
+            return
+        vector = ' || '.join(f"setweight(to_tsvector('simple', coalesce(:{field}, '')), '{self.field_labels[field]}')"
+                             for field in FIELDS)
+        session.execute(text(f"INSERT INTO module_search (module_id, document) VALUES (:id, {vector}) "
+                             f"ON CONFLICT (module_id) DO UPDATE SET document = EXCLUDED.document"), documents)
+
+    def remove(self, session, module_ids):
+        if module_ids:
+            session.execute(text("DELETE FROM module_search WHERE module_id IN :ids")
+                            .bindparams(bindparam('ids', expanding=True)), {"ids": list(module_ids)})
+
+    def ranked(self, term, alternatives=()):
+        phrases = tokenized_phrases(term, alternatives)
+        if not phrases:
+            return None
+        query = ' | '.join('(' + ' & '.join(f'{token}:*' for token in tokens) + ')' for tokens in phrases)
+        return text("SELECT module_id, -ts_rank(document, to_tsquery('simple', :search_query)) AS rank "
+                    "FROM module_search WHERE document @@ to_tsquery('simple', :search_query)") \
+            .bindparams(search_query=query) \
+            .columns(module_id=Integer, rank=Float) \
+            .subquery('search_rank')
+
+
+class TableSearchIndex(SearchIndex):
+    name = 'table'
+    table_name = 'search_terms'
+
+    def __init__(self):
+        self.metadata = MetaData()
+        self.terms = Table('search_terms', self.metadata,
+                           Column('term', String(100), primary_key=True),
+                           Column('module_id', Integer(), primary_key=True),
+                           Column('weight', Float(), nullable=False),
+                           Index('ix_search_terms_module_id', 'module_id'))
+
+    def create(self, bind):
+        self.metadata.create_all(bind, checkfirst=True)
+
+    def drop(self, bind):
+        self.metadata.drop_all(bind, checkfirst=True)
+
+    def index(self, session, documents):
+        documents = list(documents)
+        if not documents:
+            return
+        self.remove(session, [document['id'] for document in documents])
+        rows = []
+        for document in documents:
+            weights = {}
+            for field in FIELDS:
+                for token in tokenize(document.get(field)):
+                    token = token[:100]
+                    weights[token] = weights.get(token, 0.0) + FIELD_WEIGHTS[field]
+            rows.extend({"term": term, "module_id": document['id'], "weight": weight}
+                        for term, weight in weights.items())
+        if rows:
+            session.execute(self.terms.insert(), rows)
+
+    def remove(self, session, module_ids):
+        if module_ids:
+            session.execute(self.terms.delete().where(self.terms.c.module_id.in_(list(module_ids))))
+
+    def ranked(self, term, alternatives=()):
+        phrases = tokenized_phrases(term, alternatives)
+        if not phrases:
+            return None
+        ranked_phrases = [self.ranked_phrase(tokens, f'phrase_{position}') for position, tokens in enumerate(phrases)]
+        if len(ranked_phrases) == 1:
+            return ranked_phrases[0].subquery('search_rank')
+        combined = union_all(*ranked_phrases).subquery('search_phrases')
+        return select(combined.c.module_id, func.min(combined.c.rank).label('rank')) \
+            .group_by(combined.c.module_id) \
+            .subquery('search_rank')
+
+    def ranked_phrase(self, tokens, name):
+        matches = []
+        for position, token in enumerate(tokens):
+            matches.append(select(self.terms.c.module_id, func.sum(self.terms.c.weight).label('weight'))
+                           .where(and_(self.terms.c.term >= token, self.terms.c.term < token + '\uffff'))
+                           .group_by(self.terms.c.module_id)
+                           .subquery(f'{name}_token_{position}'))
+        first = matches[0]
+        query = select(first.c.module_id, (-sum(match.c.weight for match in matches)).label('rank'))
+        joined = first
+        for match in matches[1:]:
+            joined = joined.join(match, match.c.module_id == first.c.module_id)
+        return query.select_from(joined)
+
+
+def create_search_index(engine, backend=None):
+    backend = backend or engine.dialect.name
+    if backend == 'sqlite' and sqlite_has_fts5(engine):
+        return SqliteSearchIndex()
+    if backend == 'postgresql':
+        return PostgresSearchIndex()
+    return TableSearchIndex()
+
+
+def sqlite_has_fts5(engine):
+    with engine.connect() as connection:
+        options = [row[0] for row in connection.execute(text("PRAGMA compile_options"))]
+    return 'ENABLE_FTS5' in options
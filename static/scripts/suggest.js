@@ -0,0 +1,20 @@
+$(document).ready(function () {
+    let search = $("#search");
+    let suggestions = $('<datalist id="search-suggestions"></datalist>').insertAfter(search);
+    let timer;
+    let lastQuery = "";
+
+    search.attr("list", "search-suggestions");
+    search.on('input', function () {
+        let query = $(this).val().trim();
+        clearTimeout(timer);
+        if (query.length < 2 || query === lastQuery) return;
+        timer = setTimeout(() => {
+            lastQuery = query;
+            $.getJSON("/api/suggest", {"q": query}, function (response) {
+                suggestions.empty();
+                response["suggestions"].forEach(suggestion => $("<option>").attr("value", suggestion["text"]).appendTo(suggestions));
+            });
+        }, 100);
+    });
+});
\ No newline at end of file
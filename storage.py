@@ -0,0 +1,155 @@
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+
+CHUNK_SIZE = 64 * 1024
+UPLOAD_ID_PATTERN = re.compile(r'^[A-Za-z0-9-]{8,64}$')
+
+
+def current_umask():
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+
+FILE_MODE = 0o666 & ~current_umask()
+
+
+class HashingSpool:
+    def __init__(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        self.file = tempfile.NamedTemporaryFile(dir=directory, suffix='.upload')
+        self.name = self.file.name
+        self.digest = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data):
+        self.digest.update(data)
+        self.size += len(data)
+        return self.file.write(data)
+
+    def hexdigest(self):
+        return self.digest.hexdigest()
+
+    def __getattr__(self, name):
+        return getattr(self.file, name)
+
+    def __iter__(self):
+        return iter(self.file)
+
+
+class BlobStore:
+    def __init__(self, root, chunk_size=CHUNK_SIZE):
+        self.root = root
+        self.chunk_size = chunk_size
+        self.blob_root = os.path.join(root, 'blobs')
+        self.temp_root = os.path.join(root, 'tmp')
+
+    def path_for(self, digest):
+        return os.path.join(self.blob_root, digest[:2], digest)
+
+    def legacy_path(self, file_id):
+        return os.path.join(self.root, str(file_id))
+
+    def path_for_file(self, file):
+        if file.sha256:
+            path = self.path_for(file.sha256)
+            if os.path.exists(path) or not os.path.exists(self.legacy_path(file.id)):
+                return path
+        return self.legacy_path(file.id)
+
+    def exists(self, digest):
+        return os.path.isfile(self.path_for(digest))
+
+    def spool(self):
+        return HashingSpool(self.temp_root)
+
+    def store(self, file_storage):
+        stream = file_storage.stream
+        if not isinstance(stream, HashingSpool):
+            stream.seek(0)
+            spool = self.spool()
+            shutil.copyfileobj(stream, spool, self.chunk_size)
+            stream = spool
+        stream.flush()
+        digest = stream.hexdigest()
+        if not self.exists(digest):
+            self.link_into_place(stream.name, digest)
+        stream.close()
+        return digest, stream.size
+
+    def link_into_place(self, source, digest):
+        target = self.path_for(digest)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        partial = f"{target}.{os.getpid()}.part"
+        os.chmod(source, FILE_MODE)
+        try:
+            os.link(source, partial)
+        except OSError:
+            shutil.copyfile(source, partial)
+        os.replace(partial, target)
+
+    def adopt(self, path):
+        digest = hashlib.sha256()
+        size = 0
+        with open(path, 'rb') as source:
+            for chunk in iter(lambda: source.read(self.chunk_size), b''):
+                digest.update(chunk)
+                size += len(chunk)
+        digest = digest.hexdigest()
+        if self.exists(digest):
+            os.remove(path)
+        else:
+            os.makedirs(os.path.dirname(self.path_for(digest)), exist_ok=True)
+            os.replace(path, self.path_for(digest))
+        return digest, size
+
+    def chunk_path(self, upload_id, suffix='.part'):
+        if not UPLOAD_ID_PATTERN.match(upload_id):
+            raise ValueError(f"Invalid upload id {upload_id!r}")
+        return os.path.join(self.temp_root, f"{upload_id}{suffix}")
+
+    def write_chunk(self, upload_id, index, offset, file_storage):
+        if index < 0 or offset < 0:
+            raise ValueError(f"Invalid chunk {index} at offset {offset}")
+        path = self.chunk_path(upload_id)
+        os.makedirs(self.temp_root, exist_ok=True)
+        file_storage.stream.seek(0)
+        with open(path, 'r+b' if os.path.exists(path) else 'wb') as target:
+            target.seek(offset)
+            shutil.copyfileobj(file_storage.stream, target, self.chunk_size)
+        file_storage.stream.close()
+        with open(self.chunk_path(upload_id, '.chunks'), 'a') as received:
+            received.write(f"{index}\n")
+        return path
+
+    def received_chunks(self, upload_id):
+        try:
+            with open(self.chunk_path(upload_id, '.chunks'), 'r') as received:
+                return {int(line) for line in received if line.strip()}
+        except FileNotFoundError:
+            return set()
+
+    def finish_chunks(self, upload_id, total_size, total_chunks):
+        path = self.chunk_path(upload_id)
+        if self.received_chunks(upload_id) != set(range(total_chunks)) or os.path.getsize(path) != total_size:
+            raise ValueError(f"Upload {upload_id} is incomplete")
+        os.remove(self.chunk_path(upload_id, '.chunks'))
+        return path
+
+    def mark_finished(self, upload_id, file_id):
+        with open(self.chunk_path(upload_id, '.done'), 'w') as marker:
+            marker.write(str(file_id))
+
+    def finished_upload(self, upload_id):
+        try:
+            with open(self.chunk_path(upload_id, '.done'), 'r') as marker:
+                return int(marker.read())
+        except FileNotFoundError:
+            return None
+
+    def stage(self, path, file_id):
+        os.makedirs(self.root, exist_ok=True)
+        os.replace(path, self.legacy_path(file_id))
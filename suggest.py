@@ -0,0 +1,98 @@
+import bisect
+import re
+
+NORMALIZE_PATTERN = re.compile(r'[^\w]+', re.UNICODE)
+KIND_ORDER = {'area': 0, 'unit': 1, 'keyword': 2, 'acronym': 3}
+MAX_QUERY_LENGTH = 64
+
+
+def normalize(value):
+    return NORMALIZE_PATTERN.sub(' ', (value or '').lower()).strip()
+
+
+def trigrams(value):
+    padded = f"  {value} "
+    return {padded[index:index + 3] for index in range(len(padded) - 2)}
+
+
+class SuggestionIndex:
+    def __init__(self, entries):
+        self.entries = []
+        seen = set()
+        for kind, text, facet_value in entries:
+            normalized = normalize(text)
+            if normalized and (kind, normalized) not in seen:
+                seen.add((kind, normalized))
+                self.entries.append((normalized, kind, text, facet_value))
+        self.entries.sort(key=lambda entry: (entry[0], KIND_ORDER[entry[1]]))
+        self.sorted_terms = [entry[0] for entry in self.entries]
+        word_starts = sorted((normalized[index + 1:], position) for position, (normalized, _, _, _)
+                             in enumerate(self.entries) for index, char in enumerate(normalized) if char == ' ')
+        self.word_terms = [term for term, _ in word_starts]
+        self.word_positions = [position for _, position in word_starts]
+        self.trigram_counts = []
+        self.postings = {}
+        for position, (normalized, _, _, _) in enumerate(self.entries):
+            grams = trigrams(normalized)
+            self.trigram_counts.append(len(grams))
+            for gram in grams:
+                self.postings.setdefault(gram, []).append(position)
+
+    def prefix_matches(self, normalized, limit):
+        matches = []
+        for terms, positions in ((self.sorted_terms, None), (self.word_terms, self.word_positions)):
+            for index in range(bisect.bisect_left(terms, normalized), len(terms)):
+                if not terms[index].startswith(normalized) or len(matches) >= limit:
+                    break
+                position = index if positions is None else positions[index]
+                if position not in matches:
+                    matches.append(position)
+        return matches
+
+    def similar(self, normalized, threshold):
+        grams = trigrams(normalized)
+        shared = {}
+        for gram in grams:
+            for position in self.postings.get(gram, ()):
+                shared[position] = shared.get(position, 0) + 1
+        scored = []
+        for position, count in shared.items():
+            score = count / (len(grams) + self.trigram_counts[position] - count)
+            if score >= threshold:
+                scored.append((score, position))
+        scored.sort(key=lambda item: (-item[0], self.entries[item[1]][0]))
+        return scored
+
+    def suggest(self, query, limit=10, threshold=0.3, max_length=MAX_QUERY_LENGTH):
+        if len(query or '') > max_length:
+            return []
+        normalized = normalize(query)
+        if not normalized:
+            return []
+        positions = self.prefix_matches(normalized, limit)
+        if len(positions) < limit:
+            chosen = set(positions)
+            for _, position in self.similar(normalized, threshold):
+                if position not in chosen:
+                    positions.append(position)
+                    chosen.add(position)
+                if len(positions) >= limit:
+                    break
+        return [{"text": self.entries[position][2], "type": self.entries[position][1],
+                 "value": self.entries[position][3]} for position in positions]
+
+    def expand(self, query, limit=3, threshold=0.45, max_length=MAX_QUERY_LENGTH):
+        if len(query or '') > max_length:
+            return []
+        normalized = normalize(query)
+        position = bisect.bisect_left(self.sorted_terms, normalized)
+        if not normalized or (position < len(self.entries) and self.sorted_terms[position] == normalized):
+            return []
+        expansions = []
+        for score, position in self.similar(normalized, threshold):
+            candidate = self.entries[position][3]
+            if normalize(candidate) != normalized and candidate not in expansions:
+                expansions.append(candidate)
+            if len(expansions) >= limit:
+                break
+        return expansions
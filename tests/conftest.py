@@ -0,0 +1,77 @@
+import os
+import sys
+import tempfile
+import types
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = tempfile.mkdtemp(prefix='i2cl-tests-')
+
+
+class TestingConfig:
+    SECRET_KEY = 'testing'
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(DATA_DIR, 'test.sqlite')
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+    WTF_CSRF_ENABLED = False
+    UPLOAD_PATH = os.path.join(DATA_DIR, 'uploads')
+    ARCHIVE_CACHE_PATH = os.path.join(DATA_DIR, 'archives')
+    CACHE_BACKEND = 'null'
+    CACHE_GENERATION_PATH = os.path.join(DATA_DIR, 'cache_generation')
+    VOCABULARY_GENERATION_PATH = os.path.join(DATA_DIR, 'vocabulary_generation')
+    AUTH_GENERATION_PATH = os.path.join(DATA_DIR, 'auth_generation')
+    FACET_GENERATION_PATH = os.path.join(DATA_DIR, 'facet_generation')
+    JOBS_SYNCHRONOUS = True
+    EXTENSIONS_WHITELIST = []
+    EXTENSIONS_BLACKLIST = []
+    ADMIN_USERNAME = 'admin'
+    ADMIN_PASSWORD = 'password123'
+
+
+sys.path.insert(0, ROOT)
+sys.modules.setdefault('flaskconf', types.SimpleNamespace(SELECTED_CONFIG=TestingConfig))
+
+
+@pytest.fixture
+def app():
+    from app import app, db, get_search_index
+    with app.app_context():
+        db.drop_all()
+        get_search_index().drop(db.session.connection())
+        db.session.commit()
+        db.create_all()
+        get_search_index().create(db.session.connection())
+        db.session.commit()
+        for name in ('facet_index', 'suggestion_index', 'vocabulary_snapshot', 'session_users'):
+            app.extensions.pop(name, None)
+        yield app
+        db.session.remove()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def add_modules(app):
+    from app import Area, Keyword, Module, Unit, db, get_search_index, invalidate_facets, invalidate_pages, \
+        iter_module_documents, rebuild_module_summaries, record_facet_changes
+
+    def add(count):
+        area = Area.query.first() or Area(name='Area')
+        units = Unit.query.all() or [Unit(name=f"Unit {number}", area=area) for number in range(3)]
+        keywords = Keyword.query.all() or [Keyword(name=f"Keyword {number}") for number in range(3)]
+        start = Module.query.count()
+        for number in range(start, start + count):
+            db.session.add(Module(name=f"Module {number}", author='Author', description='Description', notes='',
+                                  units=units[number % 3:] or units, keywords=keywords[:number % 3 + 1]))
+        db.session.flush()
+        get_search_index().rebuild(db.session, iter_module_documents())
+        rebuild_module_summaries()
+        record_facet_changes()
+        db.session.commit()
+        invalidate_pages()
+        invalidate_facets()
+    return add
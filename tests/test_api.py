@@ -0,0 +1,44 @@
+from app import Module, db, invalidate_pages
+
+
+def test_fields_select_the_payload_keys(client, add_modules):
+    add_modules(3)
+    body = client.get('/api/v1/modules?fields=id,name').get_json()
+    assert body["total"] == 3 and body["next"] is None
+    assert [sorted(module) for module in body["data"]] == [['id', 'name']] * 3
+    module = client.get('/api/v1/modules/1?fields=units,keywords').get_json()["data"]
+    assert module == {"id": 1, "units": [{"id": number, "name": f"Unit {number - 1}", "area": 'Area'}
+                                         for number in (1, 2, 3)],
+                      "keywords": [{"id": 1, "name": 'Keyword 0', "acronym": None}]}
+
+
+def test_invalid_parameters(client, add_modules, monkeypatch):
+    add_modules(1)
+    response = client.get('/api/v1/modules?fields=id,secret')
+    assert response.status_code == 400 and 'Unknown field(s): secret' in response.get_json()["error"]
+    assert client.get('/api/v1/modules?ids=1,x').status_code == 400
+    assert client.get('/api/v1/modules?limit=0').status_code == 400
+    assert client.get('/api/v1/modules/99').get_json() == {"error": 'Module 99 does not exist'}
+    monkeypatch.setitem(client.application.config, 'API_MAX_BATCH', 2)
+    assert client.get('/api/v1/modules?ids=1,2,3').status_code == 400
+
+
+def test_ids_keep_the_requested_order(client, add_modules):
+    add_modules(3)
+    body = client.get('/api/v1/modules?ids=3,99,1,3&fields=name').get_json()
+    assert body == {"data": [{"id": 3, "name": 'Module 2'}, {"id": 1, "name": 'Module 0'}]}
+    body = client.get('/api/v1/keywords?ids=2&fields=name,sources').get_json()
+    assert body == {"data": [{"id": 2, "name": 'Keyword 1', "sources": []}]}
+
+
+def test_etag_revalidation(client, add_modules):
+    add_modules(2)
+    response = client.get('/api/v1/modules')
+    etag = response.headers['ETag']
+    assert response.headers['Cache-Control'] == 'no-cache'
+    assert client.get('/api/v1/modules', headers={'If-None-Match': etag}).status_code == 304
+    db.session.get(Module, 1).name = 'Renamed'
+    db.session.commit()
+    invalidate_pages()
+    response = client.get('/api/v1/modules', headers={'If-None-Match': etag})
+    assert response.status_code == 200 and response.headers['ETag'] != etag
@@ -0,0 +1,83 @@
+import io
+import os
+import time
+from zipfile import ZIP_DEFLATED, ZIP_STORED, ZipFile
+
+from app import File, Module, db, get_archive_cache, get_blob_store
+from downloads import ArchiveCache, stream_zip
+
+
+def write_files(tmp_path, files):
+    entries = []
+    for name, content in files.items():
+        path = tmp_path / f"source-{name}"
+        path.write_bytes(content)
+        entries.append((name, str(path)))
+    return entries
+
+
+def test_stream_zip_yields_a_complete_archive(tmp_path):
+    files = {'notes.txt': b'notes ' * 20000, 'photo.jpg': os.urandom(3000), 'empty.txt': b''}
+    chunks = list(stream_zip(write_files(tmp_path, files), chunk_size=1024))
+    assert len(chunks) > 3
+    with ZipFile(io.BytesIO(b''.join(chunks))) as archive:
+        assert archive.testzip() is None
+        assert {name: archive.read(name) for name in archive.namelist()} == files
+        assert archive.getinfo('notes.txt').compress_type == ZIP_DEFLATED
+        assert archive.getinfo('photo.jpg').compress_type == ZIP_STORED
+
+
+def test_download_all_streams_then_serves_the_cached_archive(client, tmp_path):
+    blob_store = get_blob_store()
+    module = Module(name='Lab Files', author='Author', description='', notes='')
+    for name, content in (('a.txt', b'alpha'), ('b.txt', b'beta')):
+        path = tmp_path / name
+        path.write_bytes(content)
+        digest, size = blob_store.adopt(str(path))
+        module.files.append(File(name=name, sha256=digest, size=size))
+    db.session.add(module)
+    db.session.commit()
+    get_archive_cache().invalidate(module.id)
+
+    streamed = client.get(f'/download_all/{module.id}')
+    assert streamed.headers['Content-Disposition'] == 'attachment; filename=Lab_Files.zip'
+    with ZipFile(io.BytesIO(streamed.data)) as archive:
+        assert {name: archive.read(name) for name in archive.namelist()} == {'a.txt': b'alpha', 'b.txt': b'beta'}
+    cached = client.get(f'/download_all/{module.id}')
+    assert cached.data == streamed.data
+    assert cached.headers['ETag'] == streamed.headers['ETag']
+    assert client.get(f'/download_all/{module.id}', headers={'If-None-Match': cached.headers['ETag']}) \
+        .status_code == 304
+
+
+def test_archive_cache_key_and_invalidation(tmp_path):
+    cache = ArchiveCache(str(tmp_path / 'archives'), 10 ** 6)
+    entries = write_files(tmp_path, {'a.txt': b'alpha'})
+    digest = cache.key(1, entries)
+    assert cache.get(1, digest) is None
+    path = cache.build(1, digest, entries)
+    other = cache.build(2, cache.key(2, entries), entries)
+    assert cache.get(1, digest) == path
+    with open(entries[0][1], 'ab') as source:
+        source.write(b'!')
+    changed = cache.key(1, entries)
+    assert changed != digest
+    cache.build(1, changed, entries)
+    assert not os.path.exists(path) and os.path.exists(cache.path_for(1, changed))
+    cache.invalidate(1)
+    assert cache.get(1, changed) is None and os.path.exists(other)
+
+
+def test_archive_cache_evicts_least_recently_used(tmp_path):
+    entries = write_files(tmp_path, {'data.bin': os.urandom(4000)})
+    cache = ArchiveCache(str(tmp_path / 'archives'), 10 ** 6)
+    paths = {module_id: cache.build(module_id, cache.key(module_id, entries), entries) for module_id in (1, 2)}
+    size = os.path.getsize(paths[1])
+    now = time.time()
+    os.utime(paths[1], (now - 100, now - 100))
+    os.utime(paths[2], (now - 50, now - 50))
+    assert cache.get(1, cache.key(1, entries)) == paths[1]
+    cache.max_bytes = size * 2 + size // 2
+    cache.build(3, cache.key(3, entries), entries)
+    assert os.path.exists(paths[1]) and not os.path.exists(paths[2])
+    assert os.path.exists(cache.path_for(3, cache.key(3, entries)))
@@ -0,0 +1,69 @@
+import os
+
+import pytest
+
+from app import File, db, get_blob_store
+
+CONTENT = bytes(range(256)) * 4
+
+
+@pytest.fixture
+def stored_file(app, tmp_path):
+    path = tmp_path / 'report.bin'
+    path.write_bytes(CONTENT)
+    digest, size = get_blob_store().adopt(str(path))
+    stored = File(name='report.bin', sha256=digest, size=size)
+    db.session.add(stored)
+    db.session.commit()
+    return stored
+
+
+def test_full_download_and_conditional_get(client, stored_file):
+    response = client.get(f'/download/{stored_file.id}')
+    assert response.status_code == 200
+    assert response.data == CONTENT
+    assert response.headers['Accept-Ranges'] == 'bytes'
+    assert response.headers['ETag'] == f'"{stored_file.sha256}"'
+    assert client.get(f'/download/{stored_file.id}', headers={'If-None-Match': response.headers['ETag']}) \
+        .status_code == 304
+
+
+@pytest.mark.parametrize('header, start, stop', [('bytes=0-9', 0, 10), ('bytes=1000-', 1000, 1024),
+                                                 ('bytes=-5', 1019, 1024), ('bytes=1020-5000', 1020, 1024)])
+def test_single_range(client, stored_file, header, start, stop):
+    response = client.get(f'/download/{stored_file.id}', headers={'Range': header})
+    assert response.status_code == 206
+    assert response.data == CONTENT[start:stop]
+    assert response.headers['Content-Range'] == f"bytes {start}-{stop - 1}/{len(CONTENT)}"
+    assert int(response.headers['Content-Length']) == stop - start
+
+
+def test_if_range(client, stored_file):
+    etag = f'"{stored_file.sha256}"'
+    response = client.get(f'/download/{stored_file.id}', headers={'Range': 'bytes=0-3', 'If-Range': etag})
+    assert response.status_code == 206 and response.data == CONTENT[:4]
+    response = client.get(f'/download/{stored_file.id}', headers={'Range': 'bytes=0-3', 'If-Range': '"stale"'})
+    assert response.status_code == 200 and response.data == CONTENT
+
+
+def test_unsatisfiable_range(client, stored_file):
+    response = client.get(f'/download/{stored_file.id}', headers={'Range': 'bytes=5000-6000'})
+    assert response.status_code == 416
+    assert response.headers['Content-Range'] == f"bytes */{len(CONTENT)}"
+
+
+def test_multipart_ranges(client, stored_file):
+    response = client.get(f'/download/{stored_file.id}', headers={'Range': 'bytes=0-1,10-11'})
+    assert response.status_code == 206
+    assert response.mimetype == 'multipart/byteranges'
+    boundary = response.mimetype_params['boundary'].encode()
+    assert int(response.headers['Content-Length']) == len(response.data)
+    parts = response.data.split(b'--' + boundary)
+    assert len(parts) == 4 and parts[-1] == b'--\r\n'
+    assert parts[1].endswith(b'Content-Range: bytes 0-1/1024\r\n\r\n' + CONTENT[0:2] + b'\r\n')
+    assert parts[2].endswith(b'Content-Range: bytes 10-11/1024\r\n\r\n' + CONTENT[10:12] + b'\r\n')
+
+
+def test_missing_file(client, stored_file):
+    os.remove(get_blob_store().path_for(stored_file.sha256))
+    assert client.get(f'/download/{stored_file.id}').status_code == 404
@@ -0,0 +1,22 @@
+from werkzeug.security import generate_password_hash
+
+from app import File, Module, User, db
+
+
+def test_edit_detaches_files_not_retained(client):
+    db.session.add(User(username='admin', password=generate_password_hash('password123')))
+    module = Module(name='Module', author='Author', description='Description', notes='',
+                    files=[File(name='kept.txt'), File(name='dropped.txt')])
+    db.session.add(module)
+    db.session.add(File(name='new.txt'))
+    db.session.commit()
+    kept, dropped = sorted(module.files, key=lambda file: file.id)
+    new = File.query.filter(File.name == 'new.txt').one()
+    client.post('/login', data={'username': 'admin', 'password': 'password123'})
+    assert 'kept.txt' in client.get(f'/admin/edit_module/{module.id}').get_data(as_text=True)
+    response = client.post(f'/admin/edit_module/{module.id}', json={
+        "name": 'Module', "author": 'Author', "description": 'Description', "notes": '', "links": '',
+        "unit_ids": [], "keyword_ids": [], "file_ids": [new.id], "retained_file_ids": [kept.id]})
+    assert response.get_json()["code"] == 200
+    attached = dict(db.session.query(File.name, File.module_id))
+    assert attached == {'kept.txt': module.id, 'dropped.txt': None, 'new.txt': module.id}
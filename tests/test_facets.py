@@ -0,0 +1,34 @@
+from facets import FacetIndex
+
+AREAS = [(1, 'Security'), (2, 'Networks')]
+UNITS = {1: ('Crypto', 1), 2: ('Routing', 2)}
+KEYWORDS = [(1, 'AES'), (2, 'BGP')]
+
+
+def test_update_module_matches_rebuild():
+    facet_index = FacetIndex([1, 2], AREAS, UNITS, KEYWORDS, [(1, 1), (2, 2)], [(1, 1), (2, 2)])
+    facet_index.update_module(1, [2], [2])
+    facet_index.update_module(3, [1], [1])
+    facet_index.update_module(2, exists=False)
+    rebuilt = FacetIndex([1, 3], AREAS, UNITS, KEYWORDS, [(1, 2), (3, 1)], [(1, 2), (3, 1)])
+    assert facet_index.all_modules == rebuilt.all_modules
+    assert facet_index.bitmaps == rebuilt.bitmaps
+    assert facet_index.counts({'keyword': ['BGP']}) == rebuilt.counts({'keyword': ['BGP']})
+
+
+def test_late_committed_change_is_applied(app):
+    from app import Area, FacetChange, Keyword, Module, Unit, db, get_facet_index, invalidate_facets
+    unit = Unit(name='Crypto', area=Area(name='Security'))
+    keyword = Keyword(name='AES')
+    modules = [Module(name=f"Module {number}", author='Author', units=[unit]) for number in range(3)]
+    db.session.add_all(modules + [keyword])
+    db.session.flush()
+    db.session.add_all([FacetChange(id=change_id, module_id=modules[0].id) for change_id in (1, 2, 4)])
+    db.session.commit()
+    invalidate_facets()
+    assert get_facet_index().change_id == 4
+    modules[1].keywords = [keyword]
+    db.session.add(FacetChange(id=3, module_id=modules[1].id))
+    db.session.commit()
+    invalidate_facets()
+    assert dict(get_facet_index().counts({})['keyword']) == {'AES': 1}
@@ -0,0 +1,45 @@
+import hashlib
+import os
+import time
+from datetime import date, datetime, timedelta
+
+from app import File, Module, db
+from fsck import FsckState, check_storage, reclaim_storage
+from storage import BlobStore
+
+DAY = 24 * 60 * 60
+
+
+def write_blob(blob_store, content, age=0):
+    digest = hashlib.sha256(content).hexdigest()
+    path = blob_store.path_for(digest)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as file:
+        file.write(content)
+    os.utime(path, (time.time() - age, time.time() - age))
+    return digest, path
+
+
+def test_reclaim_respects_grace_period(app, tmp_path):
+    blob_store = BlobStore(str(tmp_path))
+    attached_digest, attached_path = write_blob(blob_store, b'attached', age=2 * DAY)
+    fresh_digest, fresh_path = write_blob(blob_store, b'fresh', age=2 * DAY)
+    stale_digest, stale_path = write_blob(blob_store, b'stale', age=2 * DAY)
+    _, orphan_path = write_blob(blob_store, b'orphan', age=2 * DAY)
+    _, new_orphan_path = write_blob(blob_store, b'new orphan')
+    long_ago = datetime.utcnow() - timedelta(days=2)
+    db.session.add(Module(name='Module', author='Author', files=[File(name='attached', sha256=attached_digest,
+                                                                      created_at=long_ago)]))
+    db.session.add(File(name='fresh', sha256=fresh_digest, date_added=date(2020, 1, 1)))
+    db.session.add(File(name='stale', sha256=stale_digest, created_at=long_ago))
+    db.session.commit()
+
+    report = check_storage(db.session, File, blob_store, FsckState(None), workers=1, grace_seconds=3600)
+    assert not report.problems
+    assert [db.session.get(File, file_id).name for file_id in report.unattached] == ['stale']
+    reclaim_storage(db.session, File, blob_store, report)
+
+    assert sorted(name for name, in db.session.query(File.name)) == ['attached', 'fresh']
+    assert report.reclaimed_rows == 1
+    assert os.path.exists(attached_path) and os.path.exists(fresh_path) and os.path.exists(new_orphan_path)
+    assert not os.path.exists(orphan_path) and not os.path.exists(stale_path)
@@ -0,0 +1,67 @@
+import pytest
+
+from app import Job, db
+from jobs import FAILED, FINISHED, QUEUED, RUNNING, JobRunner, describe
+
+
+@pytest.fixture
+def runner(app):
+    runner = JobRunner(app, db, Job)
+    calls = []
+
+    @runner.task('add')
+    def add(a, b):
+        calls.append((a, b))
+        return {"sum": a + b}
+
+    @runner.task('fail')
+    def fail():
+        raise RuntimeError("boom")
+
+    runner.calls = calls
+    yield runner
+    runner.shutdown()
+
+
+def test_enqueue_deduplicates_queued_jobs_by_key(runner):
+    job = runner.enqueue('add', {"a": 1, "b": 2}, key='sum', submit=False)
+    assert job.status == QUEUED
+    assert runner.enqueue('add', {"a": 1, "b": 2}, key='sum', submit=False).id == job.id
+    assert runner.enqueue('add', {"a": 1, "b": 2}, submit=False).id != job.id
+    with pytest.raises(KeyError):
+        runner.enqueue('missing')
+
+
+def test_run_records_result_and_only_runs_once(runner):
+    job_id = runner.enqueue('add', {"a": 1, "b": 2}, submit=False).id
+    job = runner.run(job_id)
+    assert (job.status, job.started_at is not None, job.finished_at is not None) == (FINISHED, True, True)
+    assert describe(job)["result"] == {"sum": 3}
+    assert runner.run(job_id) is None
+    assert runner.calls == [(1, 2)]
+    assert runner.enqueue('add', {"a": 1, "b": 2}, key='sum', submit=False).id != job_id
+
+
+def test_failed_job_keeps_the_traceback(runner):
+    job = runner.run(runner.enqueue('fail', submit=False).id)
+    assert job.status == FAILED
+    assert 'RuntimeError: boom' in job.error
+    assert describe(job)["result"] is None
+
+
+def test_requeue_running_and_work_through_the_queue(runner):
+    first = runner.enqueue('add', {"a": 1, "b": 1}, submit=False)
+    second = runner.enqueue('add', {"a": 2, "b": 2}, submit=False)
+    first.status = RUNNING
+    db.session.commit()
+    assert runner.requeue_running() == 1
+    assert runner.work() == 2
+    assert runner.calls == [(1, 1), (2, 2)]
+    assert {job.status for job in Job.query.filter(Job.id.in_([first.id, second.id]))} == {FINISHED}
+
+
+def test_background_workers_finish_jobs(runner):
+    job_id = runner.enqueue('add', {"a": 3, "b": 4}).id
+    runner.shutdown(wait=True)
+    db.session.expire_all()
+    assert db.session.get(Job, job_id).status == FINISHED
@@ -0,0 +1,68 @@
+import gzip
+
+import pytest
+
+from app import app
+from logstats import LatencyHistogram, LogSummary, TopCounter, parse_line
+
+COMBINED = ('10.0.0.1 - admin [10/Oct/2026:10:00:00 +0000] "GET /modules?search=Crypto+graphy HTTP/1.1" 200 512 '
+            '"-" "Mozilla/5.0" 0.042')
+
+
+def test_parse_combined_line_with_timing():
+    record = parse_line(COMBINED)
+    assert (record.method, record.path, record.query, record.status, record.size, record.seconds) == \
+        ('GET', '/modules', 'search=Crypto+graphy', 200, 512, 0.042)
+
+
+@pytest.mark.parametrize('line, size, seconds', [
+    ('1.2.3.4 - - [10/Oct/2026:10:00:00 +0000] "GET /download/3 HTTP/1.1" 304 - "-" "curl"', 0, None),
+    ('1.2.3.4 - - [10/Oct/2026:10:00:00 +0000] "GET /download/3 HTTP/1.1" 200 10 rt=0.5', 10, 0.5),
+])
+def test_parse_common_line_variants(line, size, seconds):
+    record = parse_line(line)
+    assert (record.size, record.seconds) == (size, seconds)
+
+
+def test_parse_rejects_garbage():
+    assert parse_line('garbage line') is None
+
+
+def test_histogram_percentiles():
+    histogram = LatencyHistogram()
+    for milliseconds in range(1, 101):
+        histogram.add(milliseconds)
+    assert histogram.percentile(0.5) == pytest.approx(50, rel=0.1)
+    assert histogram.percentile(0.99) == pytest.approx(99, rel=0.1)
+    assert histogram.percentile(0.5) <= histogram.percentile(0.95) <= histogram.percentile(0.99)
+    assert LatencyHistogram().percentile(0.5) is None
+
+
+def test_top_counter_keeps_heavy_hitters():
+    counter = TopCounter(capacity=2)
+    for key in ['hot'] * 5 + ['warm'] * 3 + [f"cold {number}" for number in range(10)]:
+        counter.add(key, 1)
+    assert [key for key, _ in counter.most_common(2)] == ['hot', 'warm']
+    assert len(counter.counts) <= 4
+
+
+def test_summary_over_plain_and_gzipped_logs(tmp_path):
+    lines = [COMBINED,
+             '10.0.0.2 - - [10/Oct/2026:10:00:01 +0000] "GET /download/7 HTTP/1.1" 200 1000 "-" "curl" 0.1',
+             '10.0.0.2 - - [10/Oct/2026:10:00:02 +0000] "GET /download/7 HTTP/1.1" 206 500 "-" "curl" 0.1',
+             '10.0.0.2 - - [10/Oct/2026:10:00:03 +0000] "GET /download/8 HTTP/1.1" 404 0 "-" "curl" 0.1']
+    with gzip.open(tmp_path / 'access.log.1.gz', 'wt') as log:
+        log.write('\n'.join(lines[:2]) + '\n')
+    (tmp_path / 'access.log').write_text('\n'.join(lines[2:]) + '\nnot a log line\n')
+    (tmp_path / 'other.log').write_text(
+        '10.0.0.3 - - [10/Oct/2026:10:00:04 +0000] "GET /download_all/2 HTTP/1.1" 500 0 "-" "curl" 2.0\n')
+    summary = LogSummary(app.url_map).consume([str(tmp_path / name)
+                                               for name in ('access.log.1.gz', 'access.log', 'other.log')])
+    result = summary.as_dict(file_names={7: 'notes.pdf'})
+    assert (result["requests"], result["malformed"], result["bytes"]) == (5, 1, 2012)
+    assert result["period"] == {"first": '10/Oct/2026:10:00:00 +0000', "last": '10/Oct/2026:10:00:04 +0000'}
+    assert result["downloads"] == [{"file_id": 7, "name": 'notes.pdf', "requests": 2, "bytes": 1500}]
+    assert result["archives"] == []
+    assert result["searches"] == [{"term": 'crypto graphy', "requests": 1}]
+    assert result["routes"]['/download/<file_id>']["requests"] == 3
+    assert result["routes"]['/download_all/<module_id>']["errors"] == 1
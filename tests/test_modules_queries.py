@@ -0,0 +1,28 @@
+from sqlalchemy import event
+
+from app import db
+
+
+def count_queries(client, url):
+    client.get(url)
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        response = client.get(url)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+    assert response.status_code == 200
+    return len(statements)
+
+
+def test_modules_query_count_does_not_grow_with_results(client, add_modules):
+    add_modules(10)
+    few = {url: count_queries(client, url) for url in ('/modules', '/modules?search=module')}
+    add_modules(90)
+    many = {url: count_queries(client, url) for url in ('/modules', '/modules?search=module')}
+    assert few == many
+    assert max(many.values()) <= 6
@@ -0,0 +1,38 @@
+from datetime import date
+
+import pytest
+
+from app import Module
+from pagination import InvalidCursor, decode_cursor, encode_cursor
+
+ORDERING = [(Module.date_added, True), (Module.id, True)]
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor([date(2024, 2, 29), 17])
+    assert decode_cursor(cursor, ORDERING) == [date(2024, 2, 29), 17]
+
+
+@pytest.mark.parametrize('cursor', ['not base64!', encode_cursor([1]), encode_cursor(['yesterday', 1])])
+def test_invalid_cursor(cursor):
+    with pytest.raises(InvalidCursor):
+        decode_cursor(cursor, ORDERING)
+
+
+def test_api_pages_cover_every_module_once(client, add_modules):
+    add_modules(7)
+    seen, url = [], '/api/v1/modules?limit=3&fields=id'
+    while url:
+        body = client.get(url).get_json()
+        assert body["total"] == 7
+        seen += [module["id"] for module in body["data"]]
+        url = body["next"]
+    assert seen == sorted(seen, reverse=True) and len(set(seen)) == 7
+
+
+def test_bad_cursor_returns_400(client, add_modules):
+    add_modules(1)
+    assert client.get('/modules?cursor=garbage').status_code == 400
+    response = client.get('/api/v1/modules?cursor=garbage')
+    assert response.status_code == 400
+    assert response.get_json() == {"error": "Invalid cursor"}
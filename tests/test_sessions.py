@@ -0,0 +1,65 @@
+import pytest
+from sqlalchemy import event
+from werkzeug.security import generate_password_hash
+
+from app import User, db, invalidate_sessions
+
+
+@pytest.fixture
+def admin(client):
+    db.session.add(User(username='admin', password=generate_password_hash('password123')))
+    db.session.commit()
+    client.post('/login', data={'username': 'admin', 'password': 'password123'})
+    return client
+
+
+def copy_session(app, client):
+    copy = app.test_client()
+    copy.set_cookie('localhost', 'session',
+                    next(cookie.value for cookie in client.cookie_jar if cookie.name == 'session'))
+    return copy
+
+
+def user_queries(client, url):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        assert client.get(url).status_code == 200
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+    return [statement for statement in statements if 'FROM users' in statement]
+
+
+def test_signed_in_user_is_served_from_memory(admin):
+    assert admin.get('/admin').status_code == 200
+    assert user_queries(admin, '/admin') == []
+
+
+def test_session_version_change_signs_out_everywhere(app, admin):
+    assert admin.get('/admin').status_code == 200
+    User.query.filter(User.username == 'admin').update({User.session_version: User.session_version + 1})
+    db.session.commit()
+    assert admin.get('/admin').status_code == 200
+    invalidate_sessions()
+    assert admin.get('/admin').status_code == 302
+
+
+def test_logout_revokes_copies_of_the_session_cookie(app, admin):
+    copy = copy_session(app, admin)
+    assert copy.get('/admin').status_code == 200
+    admin.get('/logout')
+    assert copy.get('/admin').status_code == 302
+    admin.post('/login', data={'username': 'admin', 'password': 'password123'})
+    assert admin.get('/admin').status_code == 200
+
+
+def test_password_change_signs_out_sessions(app, admin):
+    result = app.test_cli_runner().invoke(args=['users', 'password', 'admin'], input='secret456\nsecret456\n')
+    assert result.exit_code == 0, result.output
+    assert admin.get('/admin').status_code == 302
+    assert admin.post('/login', data={'username': 'admin', 'password': 'secret456'}).status_code == 302
+    assert admin.get('/admin').status_code == 200
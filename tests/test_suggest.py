@@ -0,0 +1,48 @@
+from app import Area, Keyword, Module, Unit, db, get_search_index, invalidate_vocabulary, iter_module_documents
+from suggest import MAX_QUERY_LENGTH, SuggestionIndex
+
+INDEX = SuggestionIndex([('area', 'Data Security', 'Data Security'),
+                         ('keyword', 'Advanced Encryption Standard', 'Advanced Encryption Standard'),
+                         ('acronym', 'AES', 'Advanced Encryption Standard'),
+                         ('keyword', 'Cryptography', 'Cryptography')])
+
+
+def texts(suggestions):
+    return [suggestion["text"] for suggestion in suggestions]
+
+
+def test_prefix_matches_whole_terms_before_later_words():
+    assert texts(INDEX.suggest('a', threshold=1)) == ['Advanced Encryption Standard', 'AES']
+    assert texts(INDEX.suggest('enc', threshold=1)) == ['Advanced Encryption Standard']
+    assert texts(INDEX.suggest('secur', threshold=1)) == ['Data Security']
+
+
+def test_misspelling_and_long_queries():
+    assert texts(INDEX.suggest('cryptgraphy')) == ['Cryptography']
+    assert INDEX.expand('cryptgraphy') == ['Cryptography']
+    assert INDEX.expand('cryptography') == []
+    assert INDEX.suggest('a' * (MAX_QUERY_LENGTH + 1)) == []
+
+
+def test_suggest_endpoint(client):
+    db.session.add(Keyword(name='Advanced Encryption Standard', acronym='AES'))
+    db.session.commit()
+    invalidate_vocabulary()
+    body = client.get('/api/suggest?q=enc').get_json()
+    assert body["suggestions"] == [{"text": 'Advanced Encryption Standard', "type": 'keyword',
+                                    "value": 'Advanced Encryption Standard',
+                                    "url": '/modules?keyword=Advanced+Encryption+Standard'}]
+    assert client.get(f"/api/suggest?q={'x' * 100}").get_json()["suggestions"] == []
+
+
+def test_search_expands_misspelled_terms(client):
+    keyword = Keyword(name='Cryptography')
+    db.session.add(Module(name='Ciphers', author='Author', description='', notes='', keywords=[keyword],
+                          units=[Unit(name='Unit', area=Area(name='Area'))]))
+    db.session.add(Module(name='Routing', author='Author', description='', notes=''))
+    db.session.commit()
+    get_search_index().rebuild(db.session, iter_module_documents())
+    db.session.commit()
+    invalidate_vocabulary()
+    body = client.get('/api/v1/modules?search=cryptgraphy&fields=name').get_json()
+    assert [module["name"] for module in body["data"]] == ['Ciphers']
@@ -0,0 +1,50 @@
+import io
+import json
+import os
+
+import pytest
+from werkzeug.security import generate_password_hash
+
+from app import File, User, db, get_blob_store
+
+CONTENT = b''.join(bytes([number]) * 1000 for number in range(1, 4))
+
+
+@pytest.fixture
+def admin(client):
+    db.session.add(User(username='admin', password=generate_password_hash('password123')))
+    db.session.commit()
+    client.post('/login', data={'username': 'admin', 'password': 'password123'})
+    return client
+
+
+def post_chunk(client, index, upload_id):
+    response = client.post('/upload', data={
+        'file': (io.BytesIO(CONTENT[index * 1000:(index + 1) * 1000]), 'notes.txt'),
+        'dzuuid': upload_id, 'dzchunkindex': str(index), 'dztotalchunkcount': '3',
+        'dzchunkbyteoffset': str(index * 1000), 'dztotalfilesize': str(len(CONTENT))})
+    return json.loads(response.get_data(as_text=True))
+
+
+def test_final_chunk_alone_does_not_finish(admin):
+    assert post_chunk(admin, 2, 'final-chunk-only') == []
+    assert File.query.count() == 0
+
+
+def test_chunks_assemble_once(admin):
+    for index in (0, 2, 1):
+        file_ids = post_chunk(admin, index, 'out-of-order')
+    file_id, = file_ids
+    assert post_chunk(admin, 2, 'out-of-order') == [file_id]
+    assert File.query.count() == 1
+    stored = db.session.get(File, file_id)
+    with open(get_blob_store().path_for_file(stored), 'rb') as file:
+        assert file.read() == CONTENT
+
+
+def test_out_of_range_chunk_is_rejected(admin):
+    response = admin.post('/upload', data={
+        'file': (io.BytesIO(b'x'), 'notes.txt'), 'dzuuid': 'out-of-range', 'dzchunkindex': '3',
+        'dztotalchunkcount': '3', 'dzchunkbyteoffset': '3000', 'dztotalfilesize': '3000'})
+    assert response.status_code == 400
+    assert not os.path.exists(get_blob_store().chunk_path('out-of-range'))
@@ -0,0 +1,62 @@
+import json
+
+from app import Area, Keyword, Module, Source, Unit, db, load_vocabulary, module_keywords
+from vocabulary import split_acronym
+
+
+def write_vocabulary(tmp_path, areas, keyword_rows):
+    area_units_path = tmp_path / 'area_units.json'
+    area_units_path.write_text(json.dumps(areas))
+    keywords_path = tmp_path / 'keywords.csv'
+    keywords_path.write_text(''.join(','.join(row) + '\n' for row in keyword_rows))
+    return str(area_units_path), str(keywords_path)
+
+
+def changes(diff):
+    return {kind: {change: names for change, names in kind_changes.items() if names}
+            for kind, kind_changes in diff.changes.items() if any(kind_changes.values())}
+
+
+def test_split_acronym():
+    assert split_acronym('Advanced Encryption Standard (AES)') == ('Advanced Encryption Standard', 'AES')
+    assert split_acronym('Firewall') == ('Firewall', '')
+
+
+def test_sync_is_idempotent_and_reports_changes(app, tmp_path):
+    paths = write_vocabulary(tmp_path, {'Security': ['Crypto', 'Auth'], 'Networks': ['Routing']},
+                             [('Advanced Encryption Standard (AES)', 'NIST'), ('Firewall', 'NIST', 'CAE')])
+    assert changes(load_vocabulary(*paths)) == {
+        'areas': {'added': ['Networks', 'Security']}, 'units': {'added': ['Auth', 'Crypto', 'Routing']},
+        'sources': {'added': ['CAE', 'NIST']}, 'keywords': {'added': ['Advanced Encryption Standard', 'Firewall']}}
+    assert Keyword.query.filter(Keyword.name == 'Advanced Encryption Standard').one().acronym == 'AES'
+    assert not load_vocabulary(*paths).changed
+
+    paths = write_vocabulary(tmp_path, {'Security': ['Crypto'], 'Networks': ['Routing', 'Auth']},
+                             [('Advanced Encryption Standard (AEStd)', 'NIST'), ('Firewall', 'CAE')])
+    assert changes(load_vocabulary(*paths, dry_run=True)) == {
+        'units': {'updated': ['Auth']}, 'keywords': {'updated': ['Advanced Encryption Standard', 'Firewall']}}
+    assert Unit.query.filter(Unit.name == 'Auth').one().area.name == 'Security'
+    load_vocabulary(*paths)
+    assert Unit.query.filter(Unit.name == 'Auth').one().area.name == 'Networks'
+    assert Keyword.query.filter(Keyword.name == 'Advanced Encryption Standard').one().acronym == 'AEStd'
+
+
+def test_prune_removes_stale_entries_and_references(app, tmp_path):
+    load_vocabulary(*write_vocabulary(tmp_path, {'Security': ['Crypto'], 'Networks': ['Routing']},
+                                      [('Firewall', 'NIST'), ('Honeypot', 'CAE')]))
+    module = Module(name='Module', author='Author', description='', notes='',
+                    keywords=Keyword.query.all(), units=Unit.query.all())
+    db.session.add(module)
+    db.session.commit()
+    paths = write_vocabulary(tmp_path, {'Security': ['Crypto']}, [('Firewall', 'NIST')])
+    assert not load_vocabulary(*paths).removed
+    assert Keyword.query.count() == 2
+    assert changes(load_vocabulary(*paths, prune=True)) == {
+        'areas': {'removed': ['Networks']}, 'units': {'removed': ['Routing']},
+        'sources': {'removed': ['CAE']}, 'keywords': {'removed': ['Honeypot']}}
+    assert [area.name for area in Area.query] == ['Security']
+    assert [source.name for source in Source.query] == ['NIST']
+    db.session.expire_all()
+    assert [keyword.name for keyword in module.keywords] == ['Firewall']
+    assert [unit.name for unit in module.units] == ['Crypto']
+    assert db.session.query(module_keywords).count() == 1
@@ -0,0 +1,209 @@
+import csv
+import json
+import os
+import re
+from sqlalchemy import bindparam, select
+
+ACRONYM_PATTERN = re.compile(r"\([A-z0-9]+\)")
+AREA_UNITS_PATH = os.path.join('.data', 'database', 'area_units_edited.json')
+KEYWORDS_PATH = os.path.join('.data', 'database', 'keywords_edited.csv')
+
+
+def split_acronym(keyword):
+    acronym = ACRONYM_PATTERN.search(keyword)
+    if acronym:
+        return keyword[:(acronym.start() - 1)], acronym.group()[1:-1]
+    return keyword, ""
+
+
+def read_keywords_csv(path):
+    with open(path, 'r', newline='') as file:
+        for row in csv.reader(file):
+            if row and row[0]:
+                name, acronym = split_acronym(row[0])
+                yield name, acronym, [source for source in row[1:] if source != ""]
+
+
+def read_keywords_json(path):
+    with open(path, 'r') as file:
+        keywords = json.load(file)
+    for name, keyword in keywords.items():
+        yield name, keyword["acronym"], keyword["sources"]
+
+
+def read_keywords(path):
+    return read_keywords_json(path) if path.endswith('.json') else read_keywords_csv(path)
+
+
+def read_area_units(path):
+    with open(path, 'r') as file:
+        areas = json.load(file)
+    for area, units in areas.items():
+        yield area, units
+
+
+class VocabularyDiff:
+    def __init__(self):
+        self.changes = {}
+        self.duplicates = []
+        self.updated_unit_ids = set()
+        self.updated_keyword_ids = set()
+
+    def record(self, kind, change, names):
+        self.changes.setdefault(kind, {"added": [], "updated": [], "removed": []})[change].extend(sorted(names))
+
+    @property
+    def removed(self):
+        return any(changes["removed"] for changes in self.changes.values())
+
+    @property
+    def changed(self):
+        return any(names for changes in self.changes.values() for names in changes.values())
+
+    def summary(self):
+        return [f"{kind}: " + ', '.join(f"{len(names)} {change}" for change, names in changes.items())
+                for kind, changes in self.changes.items()]
+
+    def details(self):
+        symbols = {"added": '+', "updated": '~', "removed": '-'}
+        return [f"  {symbols[change]} {kind[:-1]} {name}"
+                for kind, changes in self.changes.items()
+                for change, names in changes.items()
+                for name in names]
+
+
+def name_ids(connection, table):
+    return {row.name: row.id for row in connection.execute(select(table.c.id, table.c.name))}
+
+
+def delete_references(connection, references, ids):
+    for column in references:
+        connection.execute(column.table.delete().where(column.in_(ids)))
+
+
+def sync_areas(connection, areas, units, area_units, diff, prune=False, unit_references=()):
+    desired = {}
+    unit_areas = {}
+    for area, area_unit_names in area_units:
+        desired[area] = area_unit_names
+        for unit in area_unit_names:
+            if unit in unit_areas:
+                diff.duplicates.append(unit)
+            unit_areas[unit] = area
+    area_ids = name_ids(connection, areas)
+    new_areas = [name for name in desired if name not in area_ids]
+    if new_areas:
+        connection.execute(areas.insert(), [{"name": name} for name in new_areas])
+        area_ids = name_ids(connection, areas)
+    diff.record('areas', 'added', new_areas)
+    existing_units = {row.name: (row.id, row.area_id)
+                      for row in connection.execute(select(units.c.id, units.c.name, units.c.area_id))}
+    new_units = [{"name": name, "area_id": area_ids[area]} for name, area in unit_areas.items()
+                 if name not in existing_units]
+    moved_units = [{"unit_id": existing_units[name][0], "new_area_id": area_ids[area]}
+                   for name, area in unit_areas.items()
+                   if name in existing_units and existing_units[name][1] != area_ids[area]]
+    if new_units:
+        connection.execute(units.insert(), new_units)
+    if moved_units:
+        connection.execute(units.update().where(units.c.id == bindparam('unit_id'))
+                           .values(area_id=bindparam('new_area_id')), moved_units)
+    diff.record('units', 'added', [unit["name"] for unit in new_units])
+    diff.record('units', 'updated', [name for name, area in unit_areas.items()
+                                     if name in existing_units and existing_units[name][1] != area_ids[area]])
+    diff.updated_unit_ids.update(unit["unit_id"] for unit in moved_units)
+    if prune:
+        stale_units = {name: unit_id for name, (unit_id, _) in existing_units.items() if name not in unit_areas}
+        stale_areas = {name: area_id for name, area_id in area_ids.items() if name not in desired}
+        if stale_units:
+            delete_references(connection, unit_references, list(stale_units.values()))
+            connection.execute(units.delete().where(units.c.id.in_(stale_units.values())))
+        if stale_areas:
+            connection.execute(areas.delete().where(areas.c.id.in_(stale_areas.values())))
+        diff.record('units', 'removed', stale_units)
+        diff.record('areas', 'removed', stale_areas)
+    return diff
+
+
+def sync_keywords(connection, keywords, sources, keyword_sources, keyword_rows, diff, prune=False,
+                  keyword_references=()):
+    desired = {}
+    for name, acronym, keyword_source_names in keyword_rows:
+        if name in desired:
+            diff.duplicates.append(name)
+        desired[name] = (acronym or "", set(keyword_source_names))
+    source_ids = name_ids(connection, sources)
+    wanted_sources = set().union(*(names for _, names in desired.values())) if desired else set()
+    new_sources = sorted(wanted_sources - source_ids.keys())
+    if new_sources:
+        connection.execute(sources.insert(), [{"name": name} for name in new_sources])
+        source_ids = name_ids(connection, sources)
+    diff.record('sources', 'added', new_sources)
+    existing = {row.name: (row.id, row.acronym or "")
+                for row in connection.execute(select(keywords.c.id, keywords.c.name, keywords.c.acronym))}
+    new_keywords = [{"name": name, "acronym": acronym} for name, (acronym, _) in desired.items()
+                    if name not in existing]
+    changed_acronyms = [{"keyword_id": existing[name][0], "new_acronym": acronym}
+                        for name, (acronym, _) in desired.items()
+                        if name in existing and existing[name][1] != acronym]
+    if new_keywords:
+        connection.execute(keywords.insert(), new_keywords)
+        existing = {row.name: (row.id, row.acronym or "")
+                    for row in connection.execute(select(keywords.c.id, keywords.c.name, keywords.c.acronym))}
+    if changed_acronyms:
+        connection.execute(keywords.update().where(keywords.c.id == bindparam('keyword_id'))
+                           .values(acronym=bindparam('new_acronym')), changed_acronyms)
+    current_pairs = {(row.keyword_id, row.source_id)
+                     for row in connection.execute(select(keyword_sources.c.keyword_id, keyword_sources.c.source_id))}
+    desired_pairs = {(existing[name][0], source_ids[source])
+                     for name, (_, keyword_source_names) in desired.items() for source in keyword_source_names}
+    desired_keyword_ids = {existing[name][0] for name in desired}
+    added_pairs = desired_pairs - current_pairs
+    removed_pairs = {pair for pair in current_pairs - desired_pairs if pair[0] in desired_keyword_ids}
+    if added_pairs:
+        connection.execute(keyword_sources.insert(),
+                           [{"keyword_id": keyword_id, "source_id": source_id}
+                            for keyword_id, source_id in sorted(added_pairs)])
+    if removed_pairs:
+        connection.execute(keyword_sources.delete()
+                           .where(keyword_sources.c.keyword_id == bindparam('old_keyword_id'))
+                           .where(keyword_sources.c.source_id == bindparam('old_source_id')),
+                           [{"old_keyword_id": keyword_id, "old_source_id": source_id}
+                            for keyword_id, source_id in sorted(removed_pairs)])
+    new_names = {keyword["name"] for keyword in new_keywords}
+    keyword_names = {keyword_id: name for name, (keyword_id, _) in existing.items()}
+    updated_ids = {keyword["keyword_id"] for keyword in changed_acronyms}
+    updated_ids.update(keyword_id for keyword_id, _ in added_pairs | removed_pairs
+                       if keyword_names[keyword_id] not in new_names)
+    diff.record('keywords', 'added', new_names)
+    diff.record('keywords', 'updated', [keyword_names[keyword_id] for keyword_id in updated_ids])
+    diff.updated_keyword_ids.update(keyword["keyword_id"] for keyword in changed_acronyms)
+    if prune:
+        stale_keywords = {name: keyword_id for name, (keyword_id, _) in existing.items() if name not in desired}
+        if stale_keywords:
+            delete_references(connection, [keyword_sources.c.keyword_id, *keyword_references],
+                              list(stale_keywords.values()))
+            connection.execute(keywords.delete().where(keywords.c.id.in_(stale_keywords.values())))
+        stale_sources = {name: source_id for name, source_id in source_ids.items() if name not in wanted_sources}
+        if stale_sources:
+            delete_references(connection, [keyword_sources.c.source_id], list(stale_sources.values()))
+            connection.execute(sources.delete().where(sources.c.id.in_(stale_sources.values())))
+        diff.record('keywords', 'removed', stale_keywords)
+        diff.record('sources', 'removed', stale_sources)
+    return diff
+
+
+class VocabularySnapshot:
+    def __init__(self, areas, keywords):
+        self.areas = areas
+        self.keywords = keywords
+
+
+def read_vocabulary_snapshot(connection, areas, units, keywords):
+    area_units = {}
+    for row in connection.execute(select(units.c.id, units.c.name, units.c.area_id).order_by(units.c.id)):
+        area_units.setdefault(row.area_id, []).append(row)
+    return VocabularySnapshot(
+        [{"id": row.id, "name": row.name, "units": area_units.get(row.id, [])}
+         for row in connection.execute(select(areas.c.id, areas.c.name).order_by(areas.c.id))],
+        connection.execute(select(keywords.c.id, keywords.c.name, keywords.c.acronym).order_by(keywords.c.id)).all())